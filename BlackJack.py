@@ -1,10 +1,26 @@
 import pygame
-import random
+import argparse
 import asyncio
+import os
 import platform
-import json
+import time
+from collections import OrderedDict
+from functools import partial
 from uuid import uuid4
 
+from analytics import SessionAnalytics, starting_hands
+from assets import AssetGroup, AssetManager, TextureAtlas
+from cards import CARD_COUNT, CARD_NAMES, CARD_VALUES, HI_LO, VALUE_SLOTS
+from engine import BETTING, GAME_OVER, INSURANCE, MAX_SEATS, PLAYING, RESULT, STARTING_BALANCE, BlackjackEngine
+from history import HISTORY_FILE, HistoryWriter
+from profiles import PROFILE_DB, ProfileStore
+from profiler import PROFILER
+from recorder import Recorder
+from rules import DEFAULT_RULES, DOUBLE, HIT, INSURE, NO_INSURANCE, OUTCOME_STATS, SPLIT, STAND, SURRENDER
+from strategy import STRATEGY_FILE, UPCARDS, load_strategy_table
+
+START_TIME = time.perf_counter()
+
 # Initialize Pygame
 pygame.init()
 
@@ -13,29 +29,36 @@ WIDTH, HEIGHT = 1280, 720
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Blackjack")
 
-# Load existing images
-CHIP_50 = pygame.transform.scale(pygame.image.load("assets/chip_50.png"), (80, 80))
-CHIP_100 = pygame.transform.scale(pygame.image.load("assets/chip_100.png"), (80, 80))
-CHIP_200 = pygame.transform.scale(pygame.image.load("assets/chip_200.png"), (80, 80))
-CHIP_500 = pygame.transform.scale(pygame.image.load("assets/chip_500.png"), (80, 80))
+# Images are registered here and decoded on first use (see assets.py); after
+# the first frame the rest are decoded in the background
+ASSETS = AssetManager()
+CHIPS = AssetGroup(ASSETS, "chip")
+for amount in [50, 100, 200, 500]:
+    CHIPS.register(amount, f"assets/chip_{amount}.png", (80, 80))
 
 CARD_WIDTH, CARD_HEIGHT = 150, 210
-CARDS = {}
-suits = ["hearts", "diamonds", "clubs", "spades"]
-values = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "jack", "queen", "king", "ace"]
-for suit in suits:
-    for value in values:
-        CARDS[f"{value}_of_{suit}"] = pygame.transform.scale(
-            pygame.image.load(f"assets/cards/{value}_of_{suit}.png"), (CARD_WIDTH, CARD_HEIGHT)
-        )
-CARD_BACK = pygame.transform.scale(pygame.image.load("assets/cards/back.png"), (CARD_WIDTH, CARD_HEIGHT))
-
-# Load wallpapers
-WALLPAPERS = {
-    "default": pygame.transform.scale(pygame.image.load("assets/wallpaper1.png"), (WIDTH, HEIGHT)),
-    "wood": pygame.transform.scale(pygame.image.load("assets/wallpaper2.png"), (WIDTH, HEIGHT)),
-    "marble": pygame.transform.scale(pygame.image.load("assets/wallpaper3.png"), (WIDTH, HEIGHT))
-}
+# Card surfaces indexed by the integer card from cards.py, plus "back"
+CARDS = AssetGroup(ASSETS, "card")
+for card in range(CARD_COUNT):
+    CARDS.register(card, f"assets/cards/{CARD_NAMES[card]}.png", (CARD_WIDTH, CARD_HEIGHT))
+CARDS.register("back", "assets/cards/back.png", (CARD_WIDTH, CARD_HEIGHT))
+
+# All card faces and the back packed into one sheet, built the first time cards are drawn
+CARD_ATLAS = None
+
+def card_atlas():
+    global CARD_ATLAS
+    if CARD_ATLAS is None:
+        keys = list(range(CARD_COUNT)) + ["back"]
+        CARD_ATLAS = TextureAtlas({key: CARDS[key] for key in keys}, (CARD_WIDTH, CARD_HEIGHT))
+        ASSETS.release(("card", key) for key in keys)
+    return CARD_ATLAS
+
+# Wallpapers
+WALLPAPERS = AssetGroup(ASSETS, "wallpaper")
+WALLPAPERS.register("default", "assets/wallpaper1.png", (WIDTH, HEIGHT), alpha=False)
+WALLPAPERS.register("wood", "assets/wallpaper2.png", (WIDTH, HEIGHT), alpha=False)
+WALLPAPERS.register("marble", "assets/wallpaper3.png", (WIDTH, HEIGHT), alpha=False)
 WALLPAPER_PRICES = {"default": 0, "wood": 500, "marble": 1000}
 OWNED_WALLPAPERS = ["default"]
 CURRENT_WALLPAPER = "default"
@@ -49,56 +72,135 @@ RED = (200, 0, 0)
 font = pygame.font.SysFont("arial", 30)
 small_font = pygame.font.SysFont("arial", 24)
 large_font = pygame.font.SysFont("arial", 50)
+tiny_font = pygame.font.SysFont("arial", 18)
 
-# File for persistent storage
+RESULT_MESSAGES = {"win": "Player wins!", "loss": "Dealer wins!", "push": "Push!", "blackjack": "Blackjack!",
+                   "surrender": "Surrendered"}
+
+# House rules for the table (see rules.Rules for the variants)
+TABLE_RULES = DEFAULT_RULES
+
+# Keyboard shortcuts for the player actions
+ACTION_KEYS = {pygame.K_SPACE: HIT, pygame.K_RETURN: STAND, pygame.K_d: DOUBLE, pygame.K_p: SPLIT,
+               pygame.K_r: SURRENDER, pygame.K_i: INSURE, pygame.K_n: NO_INSURANCE}
+
+# Player profiles (balance, wallpapers, purchases) live in one SQLite database,
+# saved behind the game by PROFILES. The single-player JSON save from before
+# profiles is imported into the first profile of a new database.
 SAVE_FILE = "game_state.json"
+PROFILES = None  # a ProfileStore, opened by open_storage()
+PROFILE = "player"  # the profile being played, chosen with --profile
+DEFAULT_STATE = {"balance": STARTING_BALANCE, "owned_wallpapers": ["default"], "current_wallpaper": "default"}
 
-# Load game state from file
-def load_game_state():
-    global LOCAL_STORAGE, OWNED_WALLPAPERS, CURRENT_WALLPAPER
-    try:
-        with open(SAVE_FILE, 'r') as f:
-            LOCAL_STORAGE.update(json.load(f))
-    except FileNotFoundError:
-        LOCAL_STORAGE = {"balance": 1000, "owned_wallpapers": ["default"], "current_wallpaper": "default"}
-    game.balance = LOCAL_STORAGE.get("balance", 1000)
-    OWNED_WALLPAPERS = LOCAL_STORAGE.get("owned_wallpapers", ["default"])
-    CURRENT_WALLPAPER = LOCAL_STORAGE.get("current_wallpaper", "default")
-    print(f"Loaded game state - Balance: {game.balance}, Wallpaper: {CURRENT_WALLPAPER}")
+# Every settled round is appended to the hand history (see history.py)
+HISTORY = None  # a HistoryWriter, opened by open_storage()
+
+# Chrome trace of the profiled sections, written on exit if F12 profiling was used
+PROFILE_TRACE = "profile_trace.json"
 
-# Save game state to file
-def save_game_state():
-    global LOCAL_STORAGE
+# Basic-strategy hints, built once and memory-mapped from strategy.bin
+STRATEGY = None  # a StrategyTable, loaded by open_storage()
+
+# Load a profile's state, creating the profile if it is new
+def load_game_state(profile=None, legacy_save=SAVE_FILE):
+    global PROFILE, OWNED_WALLPAPERS, CURRENT_WALLPAPER
+    PROFILE = profile or PROFILE
+    state = PROFILES.load(PROFILE) or PROFILES.import_json(PROFILE, legacy_save)
+    if state is None:
+        state = dict(DEFAULT_STATE)
+        PROFILES.save(PROFILE, state)
+    LOCAL_STORAGE.clear()
+    LOCAL_STORAGE.update(state)
+    game.balance = LOCAL_STORAGE["balance"]
+    # The session was built before the profile was read; start its analytics from the loaded bankroll
+    game.session.analytics = SessionAnalytics(game.balance)
+    OWNED_WALLPAPERS = LOCAL_STORAGE["owned_wallpapers"]
+    if "default" not in OWNED_WALLPAPERS:
+        OWNED_WALLPAPERS.insert(0, "default")
+    CURRENT_WALLPAPER = LOCAL_STORAGE["current_wallpaper"]
+    print(f"Loaded profile {PROFILE} - Balance: {game.balance}, Wallpaper: {CURRENT_WALLPAPER}")
+
+# Open the profile store, hand history and strategy table in `directory` and
+# load the profile. Nothing is opened or written on import, so tools that import
+# the game (the benchmarks) can keep it away from the player's files.
+def open_storage(directory=".", profile=None):
+    global PROFILES, HISTORY, STRATEGY
+    PROFILES = ProfileStore(os.path.join(directory, PROFILE_DB))
+    HISTORY = HistoryWriter(os.path.join(directory, HISTORY_FILE))
+    STRATEGY = load_strategy_table(os.path.join(directory, STRATEGY_FILE), TABLE_RULES)
+    load_game_state(profile, os.path.join(directory, SAVE_FILE))
+
+# Mark the game state changed; PROFILES commits it in the background shortly after
+def mark_state_dirty():
     LOCAL_STORAGE["balance"] = game.balance
     LOCAL_STORAGE["owned_wallpapers"] = OWNED_WALLPAPERS
     LOCAL_STORAGE["current_wallpaper"] = CURRENT_WALLPAPER
-    with open(SAVE_FILE, 'w') as f:
-        json.dump(LOCAL_STORAGE, f)
-    print(f"Saved game state - Balance: {LOCAL_STORAGE['balance']}, Wallpaper: {LOCAL_STORAGE['current_wallpaper']}")
+    PROFILES.save(PROFILE, LOCAL_STORAGE)
+
+# Write any unsaved state and release everything before leaving the game
+def quit_game():
+    if PROFILER.count:
+        events = PROFILER.dump_trace(PROFILE_TRACE)
+        print(f"Wrote {events} profiled sections to {PROFILE_TRACE}")
+    PROFILES.close()
+    HISTORY.close()
+    ASSETS.shutdown()
+    pygame.quit()
+
+# Rendered text surfaces keyed by (font, text, color). The least recently used
+# are evicted once the cached pixels exceed the byte budget.
+class TextCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text_font, text, color):
+        key = (text_font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = text_font.render(text, True, color)
+        self.surfaces[key] = surface
+        self.bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        while self.bytes > self.max_bytes and self.surfaces:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.bytes -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+        return surface
+
+
+TEXT_CACHE = TextCache(4 * 1024 * 1024)
+
+
+def render_text(text_font, text, color):
+    return TEXT_CACHE.render(text_font, text, color)
 
 # Button class
 class Button:
-    def __init__(self, x, y, width, height, text, color, hover_color):
+    def __init__(self, x, y, width, height, text, color, hover_color, action=None):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.color = color
         self.hover_color = hover_color
-        self.clicked = False
+        self.action = action  # called when the button is clicked
+        self.hovered = False
+        # Normal and hover images, label included, are rendered once; draw() is a single blit
+        self.images = {False: self.render_image(color), True: self.render_image(hover_color)}
+
+    def render_image(self, color):
+        image = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        pygame.draw.rect(image, color, image.get_rect(), border_radius=10)
+        text_surf = render_text(small_font, self.text, WHITE)
+        image.blit(text_surf, text_surf.get_rect(center=image.get_rect().center))
+        return image
 
     def draw(self):
-        mouse_pos = pygame.mouse.get_pos()
-        color = self.hover_color if self.rect.collidepoint(mouse_pos) else self.color
-        pygame.draw.rect(screen, color, self.rect, border_radius=10)
-        text_surf = small_font.render(self.text, True, WHITE)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        screen.blit(text_surf, text_rect)
-
-    def is_clicked(self, event):
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-            if self.rect.collidepoint(event.pos):
-                self.clicked = True
-                return True
-        return False
+        screen.blit(self.images[self.hovered], self.rect)
 
 # Text input class
 class TextInput:
@@ -123,114 +225,442 @@ class TextInput:
 
     def draw(self):
         pygame.draw.rect(screen, WHITE if self.active else (200, 200, 200), self.rect, border_radius=5)
-        text_surf = small_font.render(self.text, True, BLACK)
+        text_surf = render_text(small_font, self.text, BLACK)
         screen.blit(text_surf, (self.rect.x + 5, self.rect.y + 5))
 
-# Blackjack game class
-class Blackjack:
+# Buttons bucketed by the grid cells their rects overlap, so finding the button
+# under the pointer only checks the one or two buttons sharing its cell
+GRID_CELL = 64
+
+class ButtonGrid:
+    def __init__(self, buttons):
+        self.cells = {}
+        for button in buttons:
+            rect = button.rect
+            for column in range(rect.left // GRID_CELL, (rect.right - 1) // GRID_CELL + 1):
+                for row in range(rect.top // GRID_CELL, (rect.bottom - 1) // GRID_CELL + 1):
+                    self.cells.setdefault((column, row), []).append(button)
+
+    # The topmost (last drawn) button at `pos`, or None
+    def hit(self, pos):
+        for button in reversed(self.cells.get((pos[0] // GRID_CELL, pos[1] // GRID_CELL), ())):
+            if button.rect.collidepoint(pos):
+                return button
+        return None
+
+# Input handling for one state: the buttons it shows (a function, re-read by
+# refresh() when they change), its key bindings, and an optional handler that
+# sees every event (the purchase screen's text inputs). A click costs one grid
+# lookup and a key one dict lookup, however many states and buttons there are.
+class StateHandler:
+    def __init__(self, buttons, keys=None, on_event=None):
+        self.get_buttons = buttons
+        self.keys = keys or {}
+        self.on_event = on_event
+        self.refresh()
+
+    def refresh(self):
+        self.buttons = self.get_buttons()
+        self.grid = ButtonGrid(self.buttons)
+
+    def handle(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            button = self.grid.hit(event.pos)
+            if button is not None:
+                button.action()
+        elif event.type == pygame.KEYDOWN:
+            action = self.keys.get(event.key)
+            if action is not None:
+                action()
+
+# Frame-time and CPU counter, toggled with F3. Idle frames that skip drawing count
+# too, so the ms/frame average shows what the dirty-rect renderer saves, and the
+# CPU share shows what the event-driven main loop saves.
+class FrameStats:
     def __init__(self):
-        self.deck = []
-        self.player_hand = []
-        self.dealer_hand = []
-        self.balance = LOCAL_STORAGE.get("balance", 1000)
-        self.bet = 0
-        self.state = "main_menu"
-        self.stats = {"games": 0, "wins": 0, "losses": 0, "pushes": 0}
-        self.buttons = []
-        self.result_displayed = False
+        self.visible = False
+        self.first_frame = None
+        self.rect = pygame.Rect(WIDTH - 580, HEIGHT - 30, 580, 30)
+        self.text = ""
+        self.window_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.frames = 0
+        self.redraws = 0
+        self.render_time = 0.0
+        self.pixels = 0
+
+    def record(self, render_time, pixels):
+        self.frames += 1
+        self.redraws += pixels > 0
+        self.render_time += render_time
+        self.pixels += pixels
+
+    # Roll the one-second window; returns True when the text changed
+    def tick(self):
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < 1.0:
+            return False
+        frames = max(1, self.frames)
+        self.text = (f"{self.frames / elapsed:.0f} fps | {self.redraws} redraws | "
+                     f"{self.render_time * 1000 / frames:.2f} ms/frame | "
+                     f"{self.pixels * 100 / (frames * WIDTH * HEIGHT):.1f}% pixels | "
+                     f"cpu {(time.process_time() - self.cpu_start) * 100 / elapsed:.1f}%")
+        self.window_start += elapsed
+        self.cpu_start = time.process_time()
+        self.frames = self.redraws = self.pixels = 0
+        self.render_time = 0.0
+        return True
+
+    def draw(self):
+        pygame.draw.rect(screen, BLACK, self.rect)
+        text_surf = render_text(small_font, self.text, WHITE)
+        screen.blit(text_surf, (self.rect.x + 5, self.rect.y + 2))
+
+
+FRAME_STATS = FrameStats()
+
+# Section profiler overlay, toggled with F12, which also starts and stops recording.
+# Shows FPS, frame-time percentiles and the sections that took longest per frame.
+class ProfilerOverlay:
+    def __init__(self):
+        self.rect = pygame.Rect(0, HEIGHT - 330, 460, 150)
+        self.lines = []
+        self.updated = 0.0
+
+    def toggle(self):
+        PROFILER.enabled = not PROFILER.enabled
+        self.lines = ["Profiling..."]
+
+    # Refresh the figures once a second; returns True when the text changed
+    def tick(self):
+        now = time.perf_counter()
+        if not PROFILER.enabled or now - self.updated < 1.0:
+            return False
+        self.updated = now
+        summary = PROFILER.summary()
+        if summary is None:
+            return False
+        self.lines = [f"{summary['fps']:.0f} fps | frame p50 {summary['p50']:.2f} ms | p99 {summary['p99']:.2f} ms"]
+        self.lines += [f"{name}: {ms:.3f} ms/frame" for name, ms in summary["sections"]]
+        return True
+
+    def draw(self):
+        pygame.draw.rect(screen, BLACK, self.rect)
+        for i, line in enumerate(self.lines):
+            screen.blit(render_text(tiny_font, line, WHITE), (self.rect.x + 8, self.rect.y + 4 + i * 24))
+
+
+PROFILE_OVERLAY = ProfilerOverlay()
+
+# Static layers per (state, wallpaper); the table states share one
+STATIC_LAYERS = {}
+# Extra game-over panel to the left of the main one
+ANALYTICS_RECT = pygame.Rect(20, HEIGHT // 2 - 180, 350, 500)
+
+# Hi-Lo trainer panel, toggled with C at the table, and its composition labels by value slot
+COUNT_RECT = pygame.Rect(WIDTH - 290, 90, 270, 100)
+SLOT_LABELS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "T"]
+
+# Multi-seat tables spread their seats between the chips and the Hit/Stand buttons
+SEAT_AREA = (260, WIDTH - 220)
+
+# Card-fan center and width budget per seat; a single seat keeps the original centered layout
+def seat_layout(count):
+    if count == 1:
+        return [(WIDTH // 2, 400)]
+    seat_width = (SEAT_AREA[1] - SEAT_AREA[0]) // count
+    spread = max(40, min(400, seat_width - CARD_WIDTH // 2))
+    return [(SEAT_AREA[0] + index * seat_width + seat_width // 2 - CARD_WIDTH // 3, spread) for index in range(count)]
+
+# "18" for one hand, "18 / 12" for split hands
+def hand_totals(seat):
+    return " / ".join(str(hand.total) for hand in seat.hands)
+
+# Split hands share their seat's room side by side
+def hand_layout(center, spread, count):
+    if count == 1:
+        return [(center, spread)]
+    room = (spread + CARD_WIDTH) // count
+    left = center - (spread + CARD_WIDTH) // 2
+    return [(left + index * room + room // 2, max(20, room - CARD_WIDTH // 2)) for index in range(count)]
+
+STATIC_PANEL_STATES = ["main_menu", "purchase", "wallpaper", "start", "game_over"]
+
+# One player's game: the engine with its bets and balance, the screen being shown,
+# the messages and the session analytics. Widgets and drawing state belong to the
+# Blackjack front end, of which there is one per process, so a session is only
+# these few slots.
+class TableSession:
+    __slots__ = ("engine", "screen", "analytics", "result_message", "error_message", "show_count")
+
+    def __init__(self, seed=None):
+        self.engine = BlackjackEngine(LOCAL_STORAGE.get("balance", STARTING_BALANCE), seed, TABLE_RULES)
+        self.engine.add_listener(self.round_settled)
+        self.screen = "main_menu"
+        self.analytics = SessionAnalytics(self.engine.balance)
         self.result_message = ""
         self.error_message = ""
-        self.chip_buttons = [
-            Button(50, 50, 100, 50, "Bet 50", (0, 128, 0), (0, 200, 0)),
-            Button(50, 120, 100, 50, "Bet 100", (0, 128, 0), (0, 200, 0)),
-            Button(50, 190, 100, 50, "Bet 200", (0, 128, 0), (0, 200, 0)),
-            Button(50, 260, 100, 50, "Bet 500", (0, 128, 0), (0, 200, 0))
-        ]
+        self.show_count = False
+
+    # Engine listener: record, analyze and save every settled round
+    def round_settled(self, engine, results):
+        for result in results:
+            with PROFILER.section("history"):
+                HISTORY.append(result.seed, result.player_cards, result.dealer_cards, result.bet, result.actions,
+                               result.outcome, result.delta, result.balance, result.shuffles, result.position,
+                               result.seat, engine.rules)
+            self.analytics.add(result.player_cards, CARD_VALUES[result.dealer_cards[0]], result.bet, result.delta,
+                               result.balance, result.outcome)
+        if len(results) == 1:
+            self.result_message = RESULT_MESSAGES[results[0].outcome]
+        else:
+            outcomes = [OUTCOME_STATS[result.outcome] for result in results]
+            net = sum(result.delta for result in results)
+            self.result_message = (f"Won {outcomes.count('wins')}, lost {outcomes.count('losses')}, "
+                                   f"pushed {outcomes.count('pushes')}: {'+' if net >= 0 else ''}{net}$")
+        mark_state_dirty()
+
+
+# Pygame front end over a TableSession: menus, input and drawing. The rules, bets
+# and balance all live in the session's engine.
+class Blackjack:
+    def __init__(self, session):
+        self.session = session
+        self.analytics_panel = None
+        self.buttons = []
+        # Every widget is created once, with the callback its click runs
+        self.chip_buttons = [Button(50, 50 + i * 70, 100, 50, f"Bet {amount}", (0, 128, 0), (0, 200, 0),
+                                    partial(self.bet_chips, amount))
+                             for i, amount in enumerate([50, 100, 200, 500])]
         self.main_menu_buttons = [
-            Button(WIDTH // 2 - 100, HEIGHT // 2 - 100, 165, 60, "Start", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 100, HEIGHT // 2 - 20, 165, 60, "Buy", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 100, HEIGHT // 2 + 60, 165, 60, "Change Wallpaper", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 100, HEIGHT // 2 + 140, 165, 60, "Exit", (128, 0, 0), (200, 0, 0))
+            Button(WIDTH // 2 - 100, HEIGHT // 2 - 100, 165, 60, "Start", (0, 128, 0), (0, 200, 0),
+                   partial(self.show, "start")),
+            Button(WIDTH // 2 - 100, HEIGHT // 2 - 20, 165, 60, "Buy", (0, 128, 0), (0, 200, 0),
+                   partial(self.show, "purchase")),
+            Button(WIDTH // 2 - 100, HEIGHT // 2 + 60, 165, 60, "Change Wallpaper", (0, 128, 0), (0, 200, 0),
+                   partial(self.show, "wallpaper")),
+            Button(WIDTH // 2 - 100, HEIGHT // 2 + 140, 165, 60, "Exit", (128, 0, 0), (200, 0, 0),
+                   lambda: quit_game())
         ]
         self.purchase_buttons = [
-            Button(WIDTH // 2 - 300, HEIGHT // 2 + 200, 120, 50, "Buy 500", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 150, HEIGHT // 2 + 200, 120, 50, "Buy 1000", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 + 0, HEIGHT // 2 + 200, 120, 50, "Buy 2000", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 100, HEIGHT // 2 + 260, 200, 80, "Back", (128, 0, 0), (200, 0, 0))
+            Button(WIDTH // 2 - 300, HEIGHT // 2 + 200, 120, 50, "Buy 500", (0, 128, 0), (0, 200, 0),
+                   partial(self.buy_currency, 500)),
+            Button(WIDTH // 2 - 150, HEIGHT // 2 + 200, 120, 50, "Buy 1000", (0, 128, 0), (0, 200, 0),
+                   partial(self.buy_currency, 1000)),
+            Button(WIDTH // 2 + 0, HEIGHT // 2 + 200, 120, 50, "Buy 2000", (0, 128, 0), (0, 200, 0),
+                   partial(self.buy_currency, 2000)),
+            Button(WIDTH // 2 - 100, HEIGHT // 2 + 260, 200, 80, "Back", (128, 0, 0), (200, 0, 0),
+                   self.leave_purchase)
         ]
+        # Wallpaper choices sit to the right of their price labels (see draw_state)
         self.wallpaper_buttons = [
-            Button(WIDTH // 2 - 250, HEIGHT // 2 - 20, 120, 50, "Default", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 250, HEIGHT // 2 + 40, 120, 50, "Wood", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 250, HEIGHT // 2 + 100, 120, 50, "Flower", (0, 128, 0), (0, 200, 0)),
-            Button(WIDTH // 2 - 100, HEIGHT // 2 + 200, 200, 80, "Back", (128, 0, 0), (200, 0, 0))
+            Button(WIDTH // 2 - 190, HEIGHT // 2 - 85 + i * 60, 120, 50, text, (0, 128, 0), (0, 200, 0),
+                   partial(self.choose_wallpaper, wallpaper))
+            for i, (text, wallpaper) in enumerate([("Default", "default"), ("Wood", "wood"), ("Flower", "marble")])
+        ]
+        self.wallpaper_buttons.append(Button(WIDTH // 2 - 50, HEIGHT // 2 + 110, 200, 80, "Back", (128, 0, 0),
+                                             (200, 0, 0), partial(self.show, "main_menu")))
+        self.start_button = Button(WIDTH // 2 - 100, HEIGHT // 2 + 50, 200, 80, "Start", (0, 128, 0), (0, 200, 0),
+                                   partial(self.show, "table"))
+        self.exit_button = Button(WIDTH // 2 - 100, HEIGHT // 2 + 150, 200, 80, "Exit", (128, 0, 0), (200, 0, 0),
+                                  lambda: quit_game())
+        self.card_input = TextInput(WIDTH // 2 - 30, HEIGHT // 2 - 135, 400, 30)
+        self.exp_date_input = TextInput(WIDTH // 2 - 30, HEIGHT // 2 - 35, 400, 30)
+        self.cvv_input = TextInput(WIDTH // 2 - 30, HEIGHT // 2 + 65, 400, 30)
+        self.main_menu_button = Button(WIDTH - 200, 20, 150, 50, "Main Menu", (0, 128, 0), (0, 200, 0),
+                                       partial(self.reset, new_screen="main_menu"))
+        # One button per player action; update_buttons() shows the ones the engine allows
+        self.action_buttons = {
+            SURRENDER: Button(WIDTH - 200, HEIGHT - 410, 130, 50, "Surrender", (0, 128, 0), (0, 200, 0)),
+            SPLIT: Button(WIDTH - 200, HEIGHT - 340, 100, 50, "Split", (0, 128, 0), (0, 200, 0)),
+            DOUBLE: Button(WIDTH - 200, HEIGHT - 270, 100, 50, "Double", (0, 128, 0), (0, 200, 0)),
+            HIT: Button(WIDTH - 200, HEIGHT - 200, 80, 50, "Hit", (0, 128, 0), (0, 200, 0)),
+            STAND: Button(WIDTH - 200, HEIGHT - 130, 80, 50, "Stand", (0, 128, 0), (0, 200, 0)),
+            INSURE: Button(WIDTH - 200, HEIGHT - 200, 170, 50, "Insurance", (0, 128, 0), (0, 200, 0)),
+            NO_INSURANCE: Button(WIDTH - 200, HEIGHT - 130, 170, 50, "No Insurance", (128, 0, 0), (200, 0, 0))
+        }
+        for action, button in self.action_buttons.items():
+            button.action = partial(self.play, action)
+        self.play_again_button = Button(WIDTH - 200, HEIGHT - 200, 100, 50, "Play Again", (0, 128, 0), (0, 200, 0),
+                                        self.play_again)
+        self.game_over_buttons = [
+            Button(WIDTH // 2 - 100, HEIGHT // 2 + 50, 200, 80, "Reset Game", (0, 128, 0), (0, 200, 0),
+                   self.reset_game),
+            Button(WIDTH // 2 - 100, HEIGHT // 2 + 150, 200, 80, "Exit", (128, 0, 0), (200, 0, 0),
+                   lambda: quit_game())
         ]
-        self.start_button = Button(WIDTH // 2 - 100, HEIGHT // 2 + 50, 200, 80, "Start", (0, 128, 0), (0, 200, 0))
-        self.exit_button = Button(WIDTH // 2 - 100, HEIGHT // 2 + 150, 200, 80, "Exit", (128, 0, 0), (200, 0, 0))
-        self.card_input = TextInput(WIDTH // 2 - 350, HEIGHT // 2 - 40, 600, 40)
-        self.exp_date_input = TextInput(WIDTH // 2 - 350, HEIGHT // 2 + 20, 600, 40)
-        self.cvv_input = TextInput(WIDTH // 2 - 350, HEIGHT // 2 + 80, 600, 40)
-        self.main_menu_button = Button(WIDTH - 200, 20, 150, 50, "Main Menu", (0, 128, 0), (0, 200, 0))
-        self.create_deck()
-
-    def create_deck(self):
-        self.deck = [f"{value}_of_{suit}" for suit in suits for value in values]
-        random.shuffle(self.deck)
-
-    def deal_initial_cards(self):
-        self.player_hand = [self.deck.pop(), self.deck.pop()]
-        self.dealer_hand = [self.deck.pop(), self.deck.pop()]
-
-    def get_card_value(self, card):
-        value = card.split("_")[0]
-        if value in ["jack", "queen", "king"]:
-            return 10
-        elif value == "ace":
-            return 11
-        return int(value)
-
-    def calculate_hand(self, hand):
-        score = 0
-        aces = 0
-        for card in hand:
-            value = self.get_card_value(card)
-            if value == 11:
-                aces += 1
-            score += value
-        while score > 21 and aces:
-            score -= 10
-            aces -= 1
-        return score
-
-    def dealer_play(self):
-        while self.calculate_hand(self.dealer_hand) < 17:
-            self.dealer_hand.append(self.deck.pop())
-
-    def determine_winner(self):
-        if self.result_displayed:
-            return self.result_message
-        self.result_displayed = True
-        player_score = self.calculate_hand(self.player_hand)
-        dealer_score = self.calculate_hand(self.dealer_hand)
-        self.stats["games"] += 1
-        result = ""
-        if player_score > 21:
-            self.stats["losses"] += 1
-            result = "Dealer wins!"
-        elif dealer_score > 21 or player_score > dealer_score:
-            self.balance += self.bet * 2
-            self.stats["wins"] += 1
-            result = "Player wins!"
-        elif dealer_score > player_score:
-            self.stats["losses"] += 1
-            result = "Dealer wins!"
+        # Last pointer position seen in an event, so hover states replay like they were recorded
+        self.mouse_pos = (0, 0)
+        self.full_redraw = True
+        self.dirty_rects = []
+        self.animation_until = 0.0
+        self.hover = None  # the button under the pointer
+
+        # Input handling per state; handle_event() looks the current state up here
+        count_key = {pygame.K_c: self.toggle_count}
+        seat_keys = {pygame.K_0 + seats: partial(self.set_seats, seats) for seats in range(1, MAX_SEATS + 1)}
+        action_keys = {key: partial(self.play, action) for key, action in ACTION_KEYS.items()}
+        self.handlers = {
+            "main_menu": StateHandler(lambda: self.main_menu_buttons),
+            "purchase": StateHandler(lambda: self.purchase_buttons, on_event=self.purchase_input),
+            "wallpaper": StateHandler(lambda: self.wallpaper_buttons),
+            "start": StateHandler(lambda: [self.start_button, self.exit_button]),
+            BETTING: StateHandler(lambda: self.chip_buttons + [self.main_menu_button], {**seat_keys, **count_key}),
+            INSURANCE: StateHandler(lambda: self.buttons + [self.main_menu_button], {**action_keys, **count_key}),
+            PLAYING: StateHandler(lambda: self.buttons + self.chip_buttons + [self.main_menu_button],
+                                  {**action_keys, **count_key}),
+            RESULT: StateHandler(lambda: self.buttons + [self.main_menu_button], count_key),
+            GAME_OVER: StateHandler(lambda: self.game_over_buttons)
+        }
+
+    # Show `session` from now on, e.g. a fresh game from new_game()
+    def begin(self, session):
+        self.session = session
+        self.set_buttons([])
+        for text_input in [self.card_input, self.exp_date_input, self.cvv_input]:
+            text_input.text = ""
+            text_input.active = False
+        self.mouse_pos = (0, 0)
+        self.hover = None
+        self.invalidate()
+
+    @property
+    def engine(self):
+        return self.session.engine
+
+    # Menu screens are the front end's own; at the table the state is the engine's
+    @property
+    def state(self):
+        return self.engine.state if self.session.screen == "table" else self.session.screen
+
+    @property
+    def balance(self):
+        return self.engine.balance
+
+    @balance.setter
+    def balance(self, value):
+        self.engine.balance = value
+
+    @property
+    def bet(self):
+        return self.engine.bet
+
+    @property
+    def stats(self):
+        return self.engine.stats
+
+    @property
+    def player_hand(self):
+        return self.engine.player_hand
+
+    @property
+    def dealer_hand(self):
+        return self.engine.dealer_hand
+
+    # Action buttons for what the engine allows right now, or Play Again once the round settles
+    def update_buttons(self):
+        if self.state in [INSURANCE, PLAYING]:
+            allowed = self.engine.allowed_actions()
+            self.set_buttons([button for action, button in self.action_buttons.items() if allowed & 1 << action])
+        elif self.state == RESULT:
+            self.set_buttons([self.play_again_button])
+
+    # The table states show these buttons along with the chips and Main Menu
+    def set_buttons(self, buttons):
+        self.buttons = buttons
+        for state in [INSURANCE, PLAYING, RESULT]:
+            self.handlers[state].refresh()
+
+    # Apply a player action if the engine allows it
+    def play(self, action):
+        if self.engine.can(action):
+            self.engine.act(action)
+            self.update_buttons()
+
+    # Chips are only shown, and only take bets, before the deal and while playing:
+    # on every seat before the deal, on the seat whose turn it is after it
+    # (unless it has split or insured)
+    def bet_chips(self, amount):
+        if self.state == BETTING:
+            seats = range(len(self.engine.seats))
+        elif len(self.engine.active_seat.hands) == 1 and not self.engine.active_seat.insurance:
+            seats = [self.engine.active]
+        else:
+            seats = []
+        if any([self.engine.place_bet(amount, seat) for seat in seats]):
+            mark_state_dirty()
+            if self.state == BETTING:
+                self.engine.deal()
+            self.update_buttons()
+
+    def play_again(self):
+        self.engine.next_round()
+        if self.state != GAME_OVER:
+            self.reset()
+
+    def set_seats(self, seats):
+        self.engine.set_seats(seats)
+
+    def toggle_count(self):
+        self.session.show_count = not self.session.show_count
+
+    # Switch to a menu screen, or to the table with "table"
+    def show(self, new_screen):
+        self.session.screen = new_screen
+
+    def purchase_input(self, event):
+        self.card_input.handle_event(event)
+        self.exp_date_input.handle_event(event)
+        self.cvv_input.handle_event(event)
+
+    def clear_card_inputs(self):
+        self.card_input.text = ""
+        self.exp_date_input.text = ""
+        self.cvv_input.text = ""
+
+    def buy_currency(self, amount):
+        is_valid, message = self.validate_card(self.card_input.text, self.exp_date_input.text, self.cvv_input.text)
+        if is_valid:
+            self.balance += amount
+            PROFILES.record_purchase(PROFILE, amount, self.card_input.text)
+            self.session.error_message = f"Transaction of ${amount} completed successfully!"
+            self.clear_card_inputs()
+        else:
+            self.session.error_message = message
+        mark_state_dirty()
+
+    def leave_purchase(self):
+        self.session.screen = "main_menu"
+        self.clear_card_inputs()
+        self.session.error_message = ""
+
+    # Switch to an owned wallpaper, or buy it if the balance allows
+    def choose_wallpaper(self, wallpaper):
+        global CURRENT_WALLPAPER
+        if wallpaper in OWNED_WALLPAPERS:
+            CURRENT_WALLPAPER = wallpaper
+            self.session.error_message = ""
+            mark_state_dirty()
+        elif self.balance >= WALLPAPER_PRICES[wallpaper]:
+            self.balance -= WALLPAPER_PRICES[wallpaper]
+            OWNED_WALLPAPERS.append(wallpaper)
+            CURRENT_WALLPAPER = wallpaper
+            self.session.error_message = ""
+            mark_state_dirty()
         else:
-            self.balance += self.bet
-            self.stats["pushes"] += 1
-            result = "Push!"
-        self.bet = 0
-        self.result_message = result
-        save_game_state()
-        return result
+            self.session.error_message = "Insufficient balance!"
+
+    # Move the hover highlight to the button under `pos`; only the buttons involved are repainted
+    def hover_at(self, pos):
+        button = self.handlers[self.state].grid.hit(pos)
+        if button is not self.hover:
+            for changed in [self.hover, button]:
+                if changed is not None:
+                    changed.hovered = changed is button
+                    self.invalidate(changed.rect)
+            self.hover = button
 
     def validate_card(self, card_num, exp_date, cvv):
         try:
@@ -245,61 +675,107 @@ class Blackjack:
         except:
             return False, "Invalid data!"
 
-    def draw(self):
-        screen.blit(WALLPAPERS[CURRENT_WALLPAPER], (0, 0))
+    # Buttons shown in the current state, in draw order
+    def visible_buttons(self):
+        return self.handlers[self.state].buttons
+
+    # Background, panels, titles and chips for the current state, composed once per
+    # state and wallpaper and reused every frame
+    def static_layer(self):
+        key = (self.state if self.state in STATIC_PANEL_STATES else "table", CURRENT_WALLPAPER)
+        layer = STATIC_LAYERS.get(key)
+        if layer is None:
+            if any(wallpaper != CURRENT_WALLPAPER for _, wallpaper in STATIC_LAYERS):
+                STATIC_LAYERS.clear()
+            layer = pygame.Surface((WIDTH, HEIGHT)).convert()
+            self.draw_static(layer)
+            STATIC_LAYERS[key] = layer
+        return layer
+
+    def draw_static(self, surface):
+        surface.blit(WALLPAPERS[CURRENT_WALLPAPER], (0, 0))
 
         if self.state == "main_menu":
             window_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 250, 500, 500)
-            pygame.draw.rect(screen, BLACK, window_rect, border_radius=20)
-            pygame.draw.rect(screen, GOLD, window_rect, 5, border_radius=20)
-            title_text = large_font.render("Blackjack", True, GOLD)
-            screen.blit(title_text, (WIDTH // 2 - 100, HEIGHT // 2 - 200))
-            subtitle_text = font.render(f"Balance: ${self.balance}", True, WHITE)
-            screen.blit(subtitle_text, (WIDTH // 2 - 80, HEIGHT // 2 - 140))
-            for button in self.main_menu_buttons:
-                button.draw()
+            pygame.draw.rect(surface, BLACK, window_rect, border_radius=20)
+            pygame.draw.rect(surface, GOLD, window_rect, 5, border_radius=20)
+            title_text = render_text(large_font, "Blackjack", GOLD)
+            surface.blit(title_text, (WIDTH // 2 - 100, HEIGHT // 2 - 200))
             return
 
         if self.state == "purchase":
             window_rect = pygame.Rect(WIDTH // 2 - 400, HEIGHT // 2 - 300, 800, 600)
-            pygame.draw.rect(screen, BLACK, window_rect, border_radius=20)
-            pygame.draw.rect(screen, GOLD, window_rect, 5, border_radius=20)
-            title_text = large_font.render("Buy Currency", True, GOLD)
-            screen.blit(title_text, (WIDTH // 2 - 150, HEIGHT // 2 - 250))
+            pygame.draw.rect(surface, BLACK, window_rect, border_radius=20)
+            pygame.draw.rect(surface, GOLD, window_rect, 5, border_radius=20)
+            title_text = render_text(large_font, "Buy Currency", GOLD)
+            surface.blit(title_text, (WIDTH // 2 - 150, HEIGHT // 2 - 250))
 
-            # Define positions and spacing
             label_x = WIDTH // 2 - 350
             label_y_start = HEIGHT // 2 - 140
             label_spacing = 100
-            input_width = 400
-            input_height = 30
-            input_x = label_x + 320
-
-            # Card Number
-            card_label = small_font.render("Card Number (16 digits):", True, WHITE)
-            screen.blit(card_label, (label_x, label_y_start + 10))
-            self.card_input.rect.x = input_x
-            self.card_input.rect.y = label_y_start + 5
-            self.card_input.rect.width = input_width
-            self.card_input.rect.height = input_height
-            self.card_input.draw()
+            card_label = render_text(small_font, "Card Number (16 digits):", WHITE)
+            surface.blit(card_label, (label_x, label_y_start + 10))
+            exp_label = render_text(small_font, "Exp Date (MM/YY):", WHITE)
+            surface.blit(exp_label, (label_x, label_y_start + label_spacing + 10))
+            cvv_label = render_text(small_font, "CVV (3 digits):", WHITE)
+            surface.blit(cvv_label, (label_x, label_y_start + 2 * label_spacing + 10))
+            return
 
-            # Exp Date
-            exp_label = small_font.render("Exp Date (MM/YY):", True, WHITE)
-            screen.blit(exp_label, (label_x, label_y_start + label_spacing + 10))
-            self.exp_date_input.rect.x = input_x
-            self.exp_date_input.rect.y = label_y_start + label_spacing + 5
-            self.exp_date_input.rect.width = input_width
-            self.exp_date_input.rect.height = input_height
-            self.exp_date_input.draw()
+        if self.state == "wallpaper":
+            window_rect = pygame.Rect(WIDTH // 2 - 400, HEIGHT // 2 - 300, 800, 600)
+            pygame.draw.rect(surface, BLACK, window_rect, border_radius=20)
+            pygame.draw.rect(surface, GOLD, window_rect, 5, border_radius=20)
+            title_text = render_text(large_font, "Change Wallpaper", GOLD)
+            surface.blit(title_text, (WIDTH // 2 - 150, HEIGHT // 2 - 250))
+            return
+
+        if self.state == "start":
+            window_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 200, 500, 500)
+            pygame.draw.rect(surface, BLACK, window_rect, border_radius=20)
+            pygame.draw.rect(surface, GOLD, window_rect, 5, border_radius=20)
+            title_text = render_text(large_font, "Blackjack", GOLD)
+            surface.blit(title_text, (WIDTH // 2 - 100, HEIGHT // 2 - 150))
+            subtitle_text = render_text(font, "Welcome to the Casino!", WHITE)
+            surface.blit(subtitle_text, (WIDTH // 2 - 120, HEIGHT // 2 - 50))
+            return
+
+        if self.state == "game_over":
+            window_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 180, 580, 500)
+            pygame.draw.rect(surface, BLACK, window_rect, border_radius=20)
+            pygame.draw.rect(surface, GOLD, window_rect, 5, border_radius=20)
+            game_over_text = render_text(large_font, "Game Over!", GOLD)
+            surface.blit(game_over_text, (WIDTH // 2 - 100, HEIGHT // 2 - 150))
+            pygame.draw.rect(surface, BLACK, ANALYTICS_RECT, border_radius=20)
+            pygame.draw.rect(surface, GOLD, ANALYTICS_RECT, 5, border_radius=20)
+            title_text = render_text(font, "Session Analytics", GOLD)
+            surface.blit(title_text, (ANALYTICS_RECT.x + 20, ANALYTICS_RECT.y + 15))
+            return
+
+        surface.blit(CHIPS[50], (170, 50))
+        surface.blit(CHIPS[100], (170, 120))
+        surface.blit(CHIPS[200], (170, 190))
+        surface.blit(CHIPS[500], (170, 260))
+
+    def draw(self):
+        screen.blit(self.static_layer(), (0, 0))
+        self.draw_state()
+        if FRAME_STATS.visible:
+            FRAME_STATS.draw()
+        if PROFILER.enabled:
+            PROFILE_OVERLAY.draw()
+
+    def draw_state(self):
+        if self.state == "main_menu":
+            subtitle_text = render_text(font, f"Balance: ${self.balance}", WHITE)
+            screen.blit(subtitle_text, (WIDTH // 2 - 80, HEIGHT // 2 - 140))
+            for button in self.main_menu_buttons:
+                button.draw()
+            return
 
-            # CVV
-            cvv_label = small_font.render("CVV (3 digits):", True, WHITE)
-            screen.blit(cvv_label, (label_x, label_y_start + 2 * label_spacing + 10))
-            self.cvv_input.rect.x = input_x
-            self.cvv_input.rect.y = label_y_start + 2 * label_spacing + 5
-            self.cvv_input.rect.width = input_width
-            self.cvv_input.rect.height = input_height
+        if self.state == "purchase":
+            # Inputs sit to the right of their labels (see draw_static)
+            self.card_input.draw()
+            self.exp_date_input.draw()
             self.cvv_input.draw()
 
             # Purchase buttons
@@ -308,23 +784,17 @@ class Blackjack:
             self.purchase_buttons[-1].draw()
 
             # Error or success message
-            if self.error_message:
-                error_text = small_font.render(self.error_message, True, RED)
+            if self.session.error_message:
+                error_text = render_text(small_font, self.session.error_message, RED)
                 screen.blit(error_text, (WIDTH // 2 - 390, HEIGHT // 2 + 150))
             return
 
         if self.state == "wallpaper":
-            window_rect = pygame.Rect(WIDTH // 2 - 400, HEIGHT // 2 - 300, 800, 600)
-            pygame.draw.rect(screen, BLACK, window_rect, border_radius=20)
-            pygame.draw.rect(screen, GOLD, window_rect, 5, border_radius=20)
-            title_text = large_font.render("Change Wallpaper", True, GOLD)
-            screen.blit(title_text, (WIDTH // 2 - 150, HEIGHT // 2 - 250))
-            balance_text = font.render(f"Balance: ${self.balance}", True, WHITE)
+            balance_text = render_text(font, f"Balance: ${self.balance}", WHITE)
             screen.blit(balance_text, (WIDTH // 2 - 390, HEIGHT // 2 - 180))
 
-            # Define positions and spacing
+            # Labels line up with the wallpaper buttons made in __init__
             label_x = WIDTH // 2 - 390
-            button_x = label_x + 200
             y_offset = HEIGHT // 2 - 80
             button_spacing = 60
 
@@ -335,277 +805,328 @@ class Blackjack:
                                 ("Flower", "flower",
                                  f"${WALLPAPER_PRICES['marble']}" if "marble" not in OWNED_WALLPAPERS else "Owned")]
             for i, (button_text, wp, status) in enumerate(wallpaper_options):
-                status_text = small_font.render(f"{button_text}: {status}", True, WHITE)
+                status_text = render_text(small_font, f"{button_text}: {status}", WHITE)
                 screen.blit(status_text, (label_x, y_offset + i * button_spacing))
-                self.wallpaper_buttons[i].rect.x = button_x
-                self.wallpaper_buttons[i].rect.y = y_offset + i * button_spacing - 5
-                self.wallpaper_buttons[i].draw()
-
-            # Back button
-            self.wallpaper_buttons[3].rect.x = WIDTH // 2 - 50
-            self.wallpaper_buttons[3].rect.y = y_offset + 3 * button_spacing + 10
-            self.wallpaper_buttons[3].draw()
+            for button in self.wallpaper_buttons:
+                button.draw()
 
-            if self.error_message:
-                error_text = small_font.render(self.error_message, True, RED)
+            if self.session.error_message:
+                error_text = render_text(small_font, self.session.error_message, RED)
                 screen.blit(error_text, (WIDTH // 2 - 390, HEIGHT // 2 + 150))
             return
 
         if self.state == "start":
-            window_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 200, 500, 500)
-            pygame.draw.rect(screen, BLACK, window_rect, border_radius=20)
-            pygame.draw.rect(screen, GOLD, window_rect, 5, border_radius=20)
-            title_text = large_font.render("Blackjack", True, GOLD)
-            screen.blit(title_text, (WIDTH // 2 - 100, HEIGHT // 2 - 150))
-            subtitle_text = font.render("Welcome to the Casino!", True, WHITE)
-            screen.blit(subtitle_text, (WIDTH // 2 - 120, HEIGHT // 2 - 50))
             self.start_button.draw()
             self.exit_button.draw()
             return
 
         if self.state == "game_over":
-            window_rect = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 180, 580, 500)
-            pygame.draw.rect(screen, BLACK, window_rect, border_radius=20)
-            pygame.draw.rect(screen, GOLD, window_rect, 5, border_radius=20)
-            game_over_text = large_font.render("Game Over!", True, GOLD)
-            screen.blit(game_over_text, (WIDTH // 2 - 100, HEIGHT // 2 - 150))
-            stats_text = font.render(
+            stats_text = render_text(
+                font,
                 f"Games: {self.stats['games']} | Wins: {self.stats['wins']} | Losses: {self.stats['losses']} | Pushes: {self.stats['pushes']}",
-                True, WHITE
+                WHITE
             )
             screen.blit(stats_text, (WIDTH // 2 - 200, HEIGHT // 2 - 50))
             balance_change = self.balance - 1000
-            balance_text = font.render(f"Balance Change: {'+' if balance_change >= 0 else ''}{balance_change}$", True,
+            balance_text = render_text(font, f"Balance Change: {'+' if balance_change >= 0 else ''}{balance_change}$",
                                        WHITE)
             screen.blit(balance_text, (WIDTH // 2 - 200, HEIGHT // 2 - 20))
-            for button in self.buttons:
+            screen.blit(self.analytics_surface(), (ANALYTICS_RECT.x + 20, ANALYTICS_RECT.y + 55))
+            for button in self.game_over_buttons:
                 button.draw()
             return
 
-        balance_text = font.render(f"Balance: ${self.balance}", True, GOLD)
+        balance_text = render_text(font, f"Balance: ${self.balance}", GOLD)
         screen.blit(balance_text, (50, HEIGHT - 50))
-        bet_text = font.render(f"Bet: ${self.bet}", True, GOLD)
+        bet_text = render_text(font, f"Bet: ${self.bet}", GOLD)
         screen.blit(bet_text, (50, HEIGHT - 100))
 
-        screen.blit(CHIP_50, (170, 50))
-        screen.blit(CHIP_100, (170, 120))
-        screen.blit(CHIP_200, (170, 190))
-        screen.blit(CHIP_500, (170, 260))
+        if self.state == "betting":
+            seats_text = render_text(font, f"Seats: {len(self.engine.seats)} (keys 1-7)", WHITE)
+            screen.blit(seats_text, (50, HEIGHT - 150))
 
-        for i, card in enumerate(self.player_hand):
-            offset = min(80, 400 // max(1, len(self.player_hand)))
-            start_x = WIDTH // 2 - (len(self.player_hand) * offset) // 2
-            screen.blit(CARDS[card], (start_x + i * offset, HEIGHT - 250))
+        # Every hand goes to the screen in one batched blit from the card atlas
+        card_blits = []
+        active_hand = None
+        seats = self.engine.seats
+        for (center, spread), seat in zip(seat_layout(len(seats)), seats):
+            for (hand_center, hand_spread), hand in zip(hand_layout(center, spread, len(seat.hands)), seat.hands):
+                offset = min(80, hand_spread // max(1, len(hand)))
+                start_x = hand_center - (len(hand) * offset) // 2
+                for i, card in enumerate(hand):
+                    card_blits.append((card, (start_x + i * offset, HEIGHT - 250)))
+                if len(seat.hands) > 1 and hand is self.engine.active_hand:
+                    active_hand = (start_x, HEIGHT - 26, (len(hand) - 1) * offset + CARD_WIDTH, 4)
         for i, card in enumerate(self.dealer_hand):
-            if self.state == "playing" and i == 1:
-                screen.blit(CARD_BACK, (WIDTH // 2 - 100 + i * 80, 50))
+            if self.state in ["playing", "insurance"] and i == 1:
+                card_blits.append(("back", (WIDTH // 2 - 100 + i * 80, 50)))
+            else:
+                card_blits.append((card, (WIDTH // 2 - 100 + i * 80, 50)))
+        if card_blits:
+            card_atlas().blits(screen, card_blits)
+        if active_hand:
+            pygame.draw.rect(screen, GOLD, active_hand)
+
+        if self.state in ["insurance", "playing", "result"]:
+            dealer_score = self.dealer_hand.total if self.state == "result" else 0
+            if len(seats) == 1:
+                player_score_text = render_text(font, f"Player: {hand_totals(seats[0])}", WHITE)
+                screen.blit(player_score_text, (WIDTH // 2 - 100, HEIGHT - 300))
             else:
-                screen.blit(CARDS[card], (WIDTH // 2 - 100 + i * 80, 50))
-
-        if self.state in ["playing", "result"]:
-            player_score = self.calculate_hand(self.player_hand)
-            dealer_score = self.calculate_hand(self.dealer_hand) if self.state == "result" else 0
-            player_score_text = font.render(f"Player: {player_score}", True, WHITE)
-            screen.blit(player_score_text, (WIDTH // 2 - 100, HEIGHT - 300))
-            dealer_score_text = font.render(f"Dealer: {dealer_score}", True, WHITE)
+                self.draw_seat_labels(seats)
+            dealer_score_text = render_text(font, f"Dealer: {dealer_score}", WHITE)
             screen.blit(dealer_score_text, (WIDTH // 2 - 100, 20))
 
+        if self.session.show_count:
+            self.draw_count()
+
+        if self.state == "insurance":
+            prompt = "Insurance?" if len(seats) == 1 else f"Seat {self.engine.active + 1}: insurance?"
+            prompt_text = render_text(font, prompt, GOLD)
+            screen.blit(prompt_text, (WIDTH // 2 - 100, HEIGHT // 2))
+
+        if self.state == "playing":
+            hand = self.engine.active_hand
+            hint = STRATEGY.action(hand.total, hand.is_soft(), CARD_VALUES[self.dealer_hand[0]])
+            if hint and len(seats) == 1:
+                hint_text = render_text(font, f"Hint: {hint}", GOLD)
+                screen.blit(hint_text, (WIDTH // 2 + 100, HEIGHT - 300))
+            elif hint:
+                hint_text = render_text(font, f"Seat {self.engine.active + 1} hint: {hint}", GOLD)
+                screen.blit(hint_text, (WIDTH // 2 - 100, HEIGHT // 2))
+
         if self.state == "result":
-            result_text = font.render(self.result_message, True, GOLD)
+            result_text = render_text(font, self.session.result_message, GOLD)
             screen.blit(result_text, (WIDTH // 2 - 100, HEIGHT // 2))
 
-        # Draw buttons, including Main Menu button during betting, playing, or result states
-        buttons_to_draw = self.buttons + (self.chip_buttons if self.state in ["betting", "playing"] else [])
-        if self.state in ["betting", "playing", "result"]:
-            buttons_to_draw.append(self.main_menu_button)
-        for button in buttons_to_draw:
+        for button in self.visible_buttons():
             button.draw()
 
-    def reset(self, new_state="betting"):
-        self.deck = []
-        self.player_hand = []
-        self.dealer_hand = []
-        self.bet = 0
-        self.state = new_state
-        self.buttons = []
-        self.result_displayed = False
-        self.result_message = ""
-        self.error_message = ""
-        self.create_deck()
-        save_game_state()
+    # Total and result above each seat, and a bar under the seat whose turn it is
+    def draw_seat_labels(self, seats):
+        seat_width = (SEAT_AREA[1] - SEAT_AREA[0]) // len(seats)
+        for index, seat in enumerate(seats):
+            if not seat.hand.cards:
+                continue
+            left = SEAT_AREA[0] + index * seat_width
+            label = render_text(tiny_font, f"Seat {index + 1}: {hand_totals(seat)}", WHITE)
+            screen.blit(label, (left + 5, HEIGHT - 295))
+            if seat.outcome:
+                outcome_text = render_text(tiny_font, " / ".join(seat.outcomes), GOLD)
+                screen.blit(outcome_text, (left + 5, HEIGHT - 275))
+            if index == self.engine.active:
+                pygame.draw.rect(screen, GOLD, (left + 5, HEIGHT - 34, seat_width - 10, 4))
+
+    # Running count, true count and what is left in the shoe, read from the shoe's
+    # own counters; the dealer's hole card only counts once it is turned over
+    def draw_count(self):
+        shoe = self.engine.shoe
+        running, composition, remaining = shoe.running_count, list(shoe.composition), shoe.remaining()
+        if self.state in [INSURANCE, PLAYING] and len(self.dealer_hand) > 1:
+            hole = self.dealer_hand[1]
+            running -= HI_LO[hole]
+            composition[VALUE_SLOTS[hole]] += 1
+            remaining += 1
+        lines = [f"Running count: {running:+d}",
+                 f"True count: {running * CARD_COUNT / remaining:+.1f} ({remaining / CARD_COUNT:.1f} decks left)",
+                 "  ".join(f"{label} {count}" for label, count in zip(SLOT_LABELS[:5], composition[:5])),
+                 "  ".join(f"{label} {count}" for label, count in zip(SLOT_LABELS[5:], composition[5:]))]
+        pygame.draw.rect(screen, BLACK, COUNT_RECT)
+        for i, line in enumerate(lines):
+            screen.blit(render_text(tiny_font, line, WHITE), (COUNT_RECT.x + 8, COUNT_RECT.y + 6 + i * 22))
+
+    # Session figures, bankroll curve and EV heatmap for the game-over screen,
+    # drawn once per hand count and reused while the screen is up
+    def analytics_surface(self):
+        analytics = self.session.analytics
+        if self.analytics_panel is not None and self.analytics_panel[:2] == (analytics, analytics.hands):
+            return self.analytics_panel[2]
+        surface = pygame.Surface((ANALYTICS_RECT.width - 40, ANALYTICS_RECT.height - 75)).convert()
+        surface.fill(BLACK)
+        for i, line in enumerate(analytics.summary_lines()):
+            surface.blit(render_text(tiny_font, line, WHITE), (0, i * 22))
+
+        curve_rect = pygame.Rect(0, 95, surface.get_width(), 110)
+        pygame.draw.rect(surface, WHITE, curve_rect, 1)
+        points = analytics.bankroll.values()
+        if len(points) > 1:
+            low, high = min(points), max(points)
+            scale = (curve_rect.height - 8) / max(1, high - low)
+            step = (curve_rect.width - 8) / (len(points) - 1)
+            line = [(curve_rect.x + 4 + i * step, curve_rect.bottom - 4 - (value - low) * scale)
+                    for i, value in enumerate(points)]
+            pygame.draw.lines(surface, GOLD, False, line, 2)
+
+        # One row per starting hand (hard 4-20, then soft 12-21), one column per upcard
+        top = curve_rect.bottom + 30
+        cell_width = (surface.get_width() - 30) // len(UPCARDS)
+        for column, upcard in enumerate(UPCARDS):
+            label = render_text(tiny_font, "A" if upcard == 11 else str(upcard), WHITE)
+            surface.blit(label, (30 + column * cell_width + 6, top - 22))
+        for row, (total, soft) in enumerate(starting_hands()):
+            if row == 0 or (soft and total == 12):
+                surface.blit(render_text(tiny_font, "S" if soft else "H", WHITE), (6, top + row * 6))
+            for column, upcard in enumerate(UPCARDS):
+                ev = analytics.bucket_ev(total, soft, upcard)
+                if ev is None:
+                    color = (40, 40, 40)
+                else:
+                    strength = int(80 + 175 * min(1.0, abs(ev)))
+                    color = (0, strength, 0) if ev >= 0 else (strength, 0, 0)
+                surface.fill(color, (30 + column * cell_width, top + row * 6, cell_width - 1, 5))
+        self.analytics_panel = (analytics, analytics.hands, surface)
+        return surface
+
+    # Keep the main loop ticking at the frame rate for `duration` seconds
+    def animate(self, duration):
+        self.animation_until = max(self.animation_until, time.perf_counter() + duration)
+
+    def animating(self):
+        return time.perf_counter() < self.animation_until
+
+    # Mark a region (or, with no rect, the whole screen) as needing a redraw
+    def invalidate(self, rect=None):
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    # Redraw and push only what changed since the last frame; an idle table costs nothing
+    def render(self):
+        start = time.perf_counter()
+        if PROFILE_OVERLAY.tick():
+            self.invalidate(PROFILE_OVERLAY.rect)
+        if self.full_redraw:
+            self.hover = self.handlers[self.state].grid.hit(self.mouse_pos)
+            for button in self.visible_buttons():
+                button.hovered = button is self.hover
+            with PROFILER.section("draw", self.state):
+                self.draw()
+            with PROFILER.section("flip"):
+                pygame.display.flip()
+            pixels = WIDTH * HEIGHT
+            if FRAME_STATS.first_frame is None:
+                FRAME_STATS.first_frame = time.perf_counter() - START_TIME
+                print(f"First frame after {FRAME_STATS.first_frame * 1000:.0f} ms")
+                # Only what the first screen needed is loaded so far; decode the rest in the background
+                ASSETS.preload()
+        elif self.dirty_rects:
+            with PROFILER.section("draw", self.state):
+                for rect in self.dirty_rects:
+                    screen.set_clip(rect)
+                    self.draw()
+                screen.set_clip(None)
+            with PROFILER.section("flip"):
+                pygame.display.update(self.dirty_rects)
+            pixels = sum(rect.width * rect.height for rect in self.dirty_rects)
+        else:
+            pixels = 0
+        self.full_redraw = False
+        self.dirty_rects = []
+        FRAME_STATS.record(time.perf_counter() - start, pixels)
+        if FRAME_STATS.tick() and FRAME_STATS.visible:
+            self.invalidate(FRAME_STATS.rect)
+
+    # Clear the table and show `new_screen` ("table" or a menu)
+    def reset(self, new_screen="table"):
+        self.engine.new_round()
+        self.session.screen = new_screen
+        self.set_buttons([])
+        self.session.result_message = ""
+        self.session.error_message = ""
+        mark_state_dirty()
 
     def reset_game(self):
-        self.balance = 1000
-        self.stats = {"games": 0, "wins": 0, "losses": 0, "pushes": 0}
-        self.result_displayed = False
-        self.result_message = ""
-        self.error_message = ""
-        self.reset(new_state="main_menu")
+        self.engine.reset_game()
+        self.session.analytics = SessionAnalytics(self.balance)
+        self.session.result_message = ""
+        self.session.error_message = ""
+        self.reset(new_screen="main_menu")
 
 # Initialize game
 LOCAL_STORAGE = {}  # Initialize as empty to be populated by load_game_state
-game = Blackjack()
-load_game_state()
-
-def setup():
-    game.create_deck()
-
-async def update_loop():
-    global game, OWNED_WALLPAPERS, CURRENT_WALLPAPER
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            save_game_state()
-            pygame.quit()
-            return
+game = Blackjack(TableSession())
+
+# Start over at a fresh table from a saved-state dict; recorded sessions replay from here
+def new_game(state, seed=None):
+    global OWNED_WALLPAPERS, CURRENT_WALLPAPER
+    LOCAL_STORAGE.clear()
+    LOCAL_STORAGE.update(state)
+    game.begin(TableSession(seed))
+    OWNED_WALLPAPERS = list(LOCAL_STORAGE.get("owned_wallpapers", ["default"]))
+    CURRENT_WALLPAPER = LOCAL_STORAGE.get("current_wallpaper", "default")
+
+# Apply one input event to the game through the current state's handler;
+# returns False once the game has quit
+def handle_event(event):
+    if event.type == pygame.QUIT:
+        quit_game()
+        return False
 
-        if game.state == "main_menu":
-            for i, button in enumerate(game.main_menu_buttons):
-                if button.is_clicked(event):
-                    if button.text == "Start":
-                        game.state = "start"
-                    elif button.text == "Buy":
-                        game.state = "purchase"
-                    elif button.text == "Change Wallpaper":
-                        game.state = "wallpaper"
-                    elif button.text == "Exit":
-                        save_game_state()
-                        pygame.quit()
-                        return
-
-        if game.state == "purchase":
-            game.card_input.handle_event(event)
-            game.exp_date_input.handle_event(event)
-            game.cvv_input.handle_event(event)
-            for button in game.purchase_buttons:
-                if button.is_clicked(event):
-                    if button.text.startswith("Buy"):
-                        amount = int(button.text.split()[1])
-                        card_num = game.card_input.text
-                        exp_date = game.exp_date_input.text
-                        cvv = game.cvv_input.text
-                        is_valid, message = game.validate_card(card_num, exp_date, cvv)
-                        if is_valid:
-                            game.balance += amount
-                            game.error_message = f"Transaction of ${amount} completed successfully!"
-                            game.card_input.text = ""
-                            game.exp_date_input.text = ""
-                            game.cvv_input.text = ""
-                        else:
-                            game.error_message = message
-                        save_game_state()
-                    elif button.text == "Back":
-                        game.state = "main_menu"
-                        game.card_input.text = ""
-                        game.exp_date_input.text = ""
-                        game.cvv_input.text = ""
-                        game.error_message = ""
-
-        if game.state == "wallpaper":
-            for i, button in enumerate(game.wallpaper_buttons[:-1]):
-                if button.is_clicked(event):
-                    wallpaper_options = [("Default", "default"), ("Wood", "wood"), ("Marble", "marble")]
-                    button_text, wp = wallpaper_options[i]
-                    if wp in OWNED_WALLPAPERS:
-                        CURRENT_WALLPAPER = wp
-                        game.error_message = ""
-                        save_game_state()
-                    elif game.balance >= WALLPAPER_PRICES[wp]:
-                        game.balance -= WALLPAPER_PRICES[wp]
-                        OWNED_WALLPAPERS.append(wp)
-                        CURRENT_WALLPAPER = wp
-                        game.error_message = ""
-                        save_game_state()
-                    else:
-                        game.error_message = "Insufficient balance!"
-            if game.wallpaper_buttons[3].is_clicked(event):
-                game.state = "main_menu"
-
-        if game.state == "start":
-            if game.start_button.is_clicked(event):
-                game.state = "betting"
-            elif game.exit_button.is_clicked(event):
-                save_game_state()
-                pygame.quit()
+    if event.type in [pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP]:
+        game.mouse_pos = event.pos
+
+    # Hover changes only repaint the buttons involved; anything else may change the state
+    if event.type == pygame.MOUSEMOTION:
+        game.hover_at(event.pos)
+        return True
+    game.invalidate()
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+        FRAME_STATS.visible = not FRAME_STATS.visible
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F12:
+        PROFILE_OVERLAY.toggle()
+    game.handlers[game.state].handle(event)
+    return pygame.get_init()
+
+async def update_loop(events=None):
+    previous_state = game.state
+    with PROFILER.section("events"):
+        for event in pygame.event.get() if events is None else events:
+            if not handle_event(event):
                 return
 
-        if game.state in ["betting", "playing", "result"]:
-            if game.main_menu_button.is_clicked(event):
-                game.reset(new_state="main_menu")
-                continue
+    if game.state != previous_state:
+        game.animate(TRANSITION_TIME)
+    game.render()
+
+# Main loop timing: a fixed tick only while something animates; otherwise the
+# loop sleeps until input arrives
+FRAME_TIME = 1.0 / 60
+TRANSITION_TIME = 0.25
+IDLE_TIMEOUT_MS = 1000  # still wake once a second, e.g. for the F3 counter
+IDLE_POLL_INTERVAL = 1.0 / 15  # the browser build cannot block, so it polls slowly instead
+
+async def wait_for_events():
+    if game.animating():
+        await asyncio.sleep(FRAME_TIME)
+        return pygame.event.get()
+    if platform.system() == "Emscripten":
+        await asyncio.sleep(IDLE_POLL_INTERVAL)
+        return pygame.event.get()
+    event = pygame.event.wait(IDLE_TIMEOUT_MS)
+    events = [] if event.type == pygame.NOEVENT else [event]
+    return events + pygame.event.get()
 
-            for button in game.chip_buttons:
-                if button.is_clicked(event):
-                    bet_amount = int(button.text.split()[1])
-                    if game.balance >= bet_amount:
-                        game.bet += bet_amount
-                        game.balance -= bet_amount
-                        save_game_state()
-                        if game.state == "betting":
-                            game.state = "playing"
-                            game.deal_initial_cards()
-                            game.buttons = [
-                                Button(WIDTH - 200, HEIGHT - 200, 80, 50, "Hit", (0, 128, 0), (0, 200, 0)),
-                                Button(WIDTH - 200, HEIGHT - 130, 80, 50, "Stand", (0, 128, 0), (0, 200, 0))
-                            ]
-
-        if game.state == "playing":
-            for button in game.buttons:
-                if button.is_clicked(event):
-                    if button.text == "Hit":
-                        game.player_hand.append(game.deck.pop())
-                    elif button.text == "Stand":
-                        game.dealer_play()
-                        game.state = "result"
-                        game.determine_winner()
-                        game.buttons = [
-                            Button(WIDTH - 200, HEIGHT - 200, 90, 50, "Play Again", (0, 128, 0), (0, 200, 0))
-                        ]
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    game.player_hand.append(game.deck.pop())
-                elif event.key == pygame.K_RETURN:
-                    game.dealer_play()
-                    game.state = "result"
-                    game.determine_winner()
-                    game.buttons = [
-                        Button(WIDTH - 200, HEIGHT - 200, 100, 50, "Play Again", (0, 128, 0), (0, 200, 0))
-                    ]
-
-        if game.state == "result":
-            for button in game.buttons:
-                if button.is_clicked(event):
-                    if button.text == "Play Again":
-                        if game.balance <= 0:
-                            game.state = "game_over"
-                            game.buttons = [
-                                Button(WIDTH // 2 - 100, HEIGHT // 2 + 50, 200, 80, "Reset Game", (0, 128, 0),
-                                       (0, 200, 0)),
-                                Button(WIDTH // 2 - 100, HEIGHT // 2 + 150, 200, 80, "Exit", (128, 0, 0), (200, 0, 0))
-                            ]
-                        else:
-                            game.reset(new_state="betting")
-
-        if game.state == "game_over":
-            for button in game.buttons:
-                if button.is_clicked(event):
-                    if button.text == "Reset Game":
-                        game.reset_game()
-                    elif button.text == "Exit":
-                        save_game_state()
-                        pygame.quit()
-                        return
-
-    game.draw()
-    pygame.display.flip()
-
-async def main():
-    setup()
-    while True:
-        await update_loop()
-        await asyncio.sleep(1.0 / 60)
+async def main(recorder=None):
+    while pygame.get_init():
+        events = await wait_for_events()
+        if recorder is not None:
+            recorder.record(events)
+        with PROFILER.frame():
+            await update_loop(events)
+            PROFILES.poll()
+    if recorder is not None:
+        recorder.save()
 
 if platform.system() == "Emscripten":
+    open_storage()
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
\ No newline at end of file
+        parser = argparse.ArgumentParser(description="Blackjack")
+        parser.add_argument("--record", metavar="SESSION",
+                            help="save the input of this session for replays (see recorder.py)")
+        parser.add_argument("--profile", help=f"player profile to load or create (default: {PROFILE})")
+        args = parser.parse_args()
+        open_storage(profile=args.profile)
+        asyncio.run(main(Recorder(args.record, game.engine.seed, LOCAL_STORAGE) if args.record else None))
\ No newline at end of file
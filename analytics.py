@@ -0,0 +1,236 @@
+# Session analytics: win rate, bankroll, variance, drawdown and EV by starting hand
+#
+# Every figure is a one-pass streaming aggregate with a fixed memory footprint, so
+# the same code summarizes a 30-hand session in the game and a history file with
+# tens of millions of hands. Hands come from the game, a history.py file, or a
+# per-hand simulation on the game's own engine.
+import argparse
+import math
+from array import array
+
+from cards import CARD_VALUES, Hand
+from engine import INSURANCE, PLAYING, BlackjackEngine
+from history import HISTORY_FILE, HistoryReader
+from rules import DEALER_STAND_TOTAL, DEFAULT_RULES, OUTCOME_STATS, add_rules_arguments, rules_from_args
+from strategy import TABLE_SIZE, TOTALS, UPCARDS, table_index
+
+ROLLING_WINDOW = 100
+CURVE_POINTS = 256  # keep even, see DecimatedSeries
+OUTCOME_CODES = {"win": 0, "loss": 1, "push": 2, "blackjack": 0, "surrender": 1}
+# Bet per simulated hand: large enough that 3:2, 6:5 and half-bet returns are whole chips
+SIMULATED_BET = 10
+
+
+# Welford's online mean and variance
+class RunningStats:
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+
+# Outcome counts over the last `window` hands, kept in a ring buffer
+class RollingOutcomes:
+    __slots__ = ("ring", "next", "counts")
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.ring = array("b", [-1]) * window
+        self.next = 0
+        self.counts = [0, 0, 0]
+
+    def add(self, outcome):
+        code = OUTCOME_CODES[outcome]
+        old = self.ring[self.next]
+        if old >= 0:
+            self.counts[old] -= 1
+        self.ring[self.next] = code
+        self.counts[code] += 1
+        self.next = (self.next + 1) % len(self.ring)
+
+    def hands(self):
+        return sum(self.counts)
+
+    def win_rate(self):
+        return self.counts[OUTCOME_CODES["win"]] / max(1, self.hands())
+
+
+# A series thinned to at most `max_points` samples: when full, every other point
+# is dropped and the sampling stride doubles, so the whole history stays visible
+class DecimatedSeries:
+    __slots__ = ("max_points", "points", "stride", "seen", "last", "last_sampled")
+
+    def __init__(self, max_points=CURVE_POINTS):
+        self.max_points = max_points
+        self.points = []
+        self.stride = 1
+        self.seen = 0
+        self.last = None
+        self.last_sampled = False
+
+    def add(self, value):
+        self.last_sampled = self.seen % self.stride == 0
+        if self.last_sampled:
+            self.points.append(value)
+            if len(self.points) > self.max_points:
+                # The newest point sits at an even index, so it survives the thinning
+                self.points = self.points[::2]
+                self.stride *= 2
+        self.seen += 1
+        self.last = value
+
+    # Sampled points plus the latest value, ready to plot
+    def values(self):
+        return self.points if self.last_sampled else self.points + [self.last]
+
+
+# One per game session, so its parts are slotted and the buckets are packed
+# arrays (hand counts as 32-bit, which is ample for any history file)
+class SessionAnalytics:
+    __slots__ = ("hands", "outcomes", "net", "results", "recent", "bankroll", "peak", "low", "max_drawdown",
+                 "bucket_hands", "bucket_net")
+
+    def __init__(self, starting_balance=0, window=ROLLING_WINDOW, curve_points=CURVE_POINTS):
+        self.hands = 0
+        self.outcomes = dict.fromkeys(OUTCOME_STATS, 0)
+        self.net = 0
+        self.results = RunningStats()  # balance change per unit bet
+        self.recent = RollingOutcomes(window)
+        self.bankroll = DecimatedSeries(curve_points)
+        self.bankroll.add(starting_balance)
+        self.peak = self.low = starting_balance
+        self.max_drawdown = 0
+        # Fixed buckets by starting hand (total, soft) and dealer upcard, in strategy.py's layout
+        self.bucket_hands = array("I", [0]) * TABLE_SIZE
+        self.bucket_net = array("d", [0.0]) * TABLE_SIZE
+
+    # One settled hand: the player's first two cards, the dealer's upcard (2-11),
+    # the bet, the balance change and the balance afterwards
+    def add(self, player_cards, upcard, bet, delta, balance, outcome):
+        self.hands += 1
+        self.outcomes[outcome] += 1
+        self.net += delta
+        result = delta / bet if bet else 0.0
+        self.results.add(result)
+        self.recent.add(outcome)
+        self.bankroll.add(balance)
+        self.peak = max(self.peak, balance)
+        self.low = min(self.low, balance)
+        self.max_drawdown = max(self.max_drawdown, self.peak - balance)
+        start = Hand(player_cards[:2])
+        if start.total < TOTALS:
+            index = table_index(start.total, start.is_soft(), upcard)
+            self.bucket_hands[index] += 1
+            self.bucket_net[index] += result
+
+    def add_record(self, record):
+        self.add(record.player_cards, CARD_VALUES[record.dealer_cards[0]], record.bet, record.delta, record.balance,
+                 record.outcome)
+
+    def drawdown(self):
+        return self.peak - self.bankroll.last
+
+    # Mean balance change per unit bet for a starting hand, or None if never dealt
+    def bucket_ev(self, total, soft, upcard):
+        index = table_index(total, soft, upcard)
+        hands = self.bucket_hands[index]
+        return self.bucket_net[index] / hands if hands else None
+
+    def summary_lines(self):
+        win_rate = (self.outcomes["win"] + self.outcomes["blackjack"]) / max(1, self.hands)
+        return [f"Hands: {self.hands}  Win rate: {win_rate:.1%}",
+                f"Last {self.recent.hands()}: {self.recent.win_rate():.1%} won",
+                f"EV/hand: {self.results.mean:+.3f} bets  SD: {self.results.stdev():.3f}",
+                f"Net: {self.net:+}  Max drawdown: {self.max_drawdown}"]
+
+
+# Starting hands in report order: hard 4-20, then soft 12-21
+def starting_hands():
+    return [(total, 0) for total in range(4, 21)] + [(total, 1) for total in range(12, 22)]
+
+
+# Play `count` hands one at a time on a BlackjackEngine with `rules`, hitting below
+# `stand_on` and declining insurance, and yield (player cards, dealer cards,
+# outcome, delta) for a one-unit bet
+def simulated_hands(count, seed=None, stand_on=DEALER_STAND_TOTAL, rules=DEFAULT_RULES):
+    engine = BlackjackEngine(SIMULATED_BET * 2 * (count + 1), seed, rules)
+    for _ in range(count):
+        engine.place_bet(SIMULATED_BET)
+        engine.deal()
+        if engine.state == INSURANCE:
+            engine.decline_insurance()
+        while engine.state == PLAYING:
+            if engine.active_hand.total < stand_on:
+                engine.hit()
+            else:
+                engine.stand()
+        result = engine.last_results[0]
+        yield result.player_cards, result.dealer_cards, result.outcome, result.delta / SIMULATED_BET
+        engine.next_round()
+
+
+def print_report(analytics, min_hands):
+    for line in analytics.summary_lines():
+        print(line)
+    print(f"outcomes: {analytics.outcomes}  variance/hand: {analytics.results.variance():.4f}")
+    curve = analytics.bankroll.values()
+    print(f"bankroll: {len(curve)} points (every {analytics.bankroll.stride} hands), "
+          f"low {analytics.low}, high {analytics.peak}, now {curve[-1]}")
+    print(f"\nEV per unit bet by starting hand and dealer upcard (buckets with at least {min_hands} hands)")
+    print("      " + "".join(f"{'A' if up == 11 else up:>7}" for up in UPCARDS))
+    for total, soft in starting_hands():
+        cells = []
+        for upcard in UPCARDS:
+            ev = analytics.bucket_ev(total, soft, upcard)
+            hands = analytics.bucket_hands[table_index(total, soft, upcard)]
+            cells.append(f"{ev:>+7.2f}" if ev is not None and hands >= min_hands else f"{'.':>7}")
+        print(f"{'S' if soft else 'H'}{total:<5}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming analytics over recorded or simulated hands")
+    parser.add_argument("--history", default=None, help="hand history file (default history.bin)")
+    parser.add_argument("--simulate", type=int, default=0, metavar="HANDS",
+                        help="analyze HANDS simulated hands instead of a history file")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stand-on", type=int, default=DEALER_STAND_TOTAL)
+    parser.add_argument("--window", type=int, default=ROLLING_WINDOW, help="hands in the rolling win rate")
+    parser.add_argument("--min-hands", type=int, default=1, help="hide EV buckets with fewer hands")
+    add_rules_arguments(parser)
+    args = parser.parse_args()
+
+    if args.simulate:
+        analytics = SessionAnalytics(0, args.window)
+        balance = 0
+        for player_cards, dealer_cards, outcome, delta in simulated_hands(args.simulate, args.seed, args.stand_on,
+                                                                          rules_from_args(args)):
+            balance += delta
+            analytics.add(player_cards, CARD_VALUES[dealer_cards[0]], 1, delta, balance, outcome)
+    else:
+        reader = HistoryReader(args.history or HISTORY_FILE)
+        if not len(reader):
+            print("no hands recorded")
+            return
+        first = reader[0]
+        analytics = SessionAnalytics(first.balance - first.delta, args.window)
+        for record in reader.records():
+            analytics.add_record(record)
+        reader.close()
+    print_report(analytics, args.min_hands)
+
+
+if __name__ == "__main__":
+    main()
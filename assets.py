@@ -0,0 +1,143 @@
+# Lazy image loading for the pygame front end
+#
+# Images are registered up front but only decoded when first used. The rest can
+# be decoded on a background thread pool, and every image is kept pre-scaled in
+# an on-disk cache so later launches skip PNG decoding and scaling entirely.
+import hashlib
+import os
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+# The browser build cannot start threads, so it loads everything on demand
+THREADS_AVAILABLE = platform.system() != "Emscripten"
+
+CACHE_DIR = ".asset_cache"
+CACHE_VERSION = 1  # bump when the cached pixel format changes
+PIXEL_FORMAT = "RGBA"
+
+image_to_bytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+image_from_bytes = getattr(pygame.image, "frombytes", None) or pygame.image.fromstring
+
+
+class AssetManager:
+    def __init__(self, cache_dir=CACHE_DIR, workers=4, threaded=True):
+        self.cache_dir = os.path.join(cache_dir, f"v{CACHE_VERSION}")
+        self.specs = {}
+        self.surfaces = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers) if threaded and THREADS_AVAILABLE else None
+
+    # `alpha` images keep per-pixel transparency; the rest are converted to the opaque display format
+    def register(self, key, path, size, alpha=True):
+        self.specs[key] = (path, tuple(size), alpha)
+
+    def cache_path(self, key):
+        path, size, _ = self.specs[key]
+        stat = os.stat(path)
+        digest = hashlib.sha1(f"{path}|{stat.st_mtime_ns}|{stat.st_size}|{size}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:20] + ".rgba")
+
+    # Decode and scale an image, or read its scaled pixels back from the cache.
+    # Safe to run off the main thread: it never touches the display.
+    def load_pixels(self, key):
+        path, size, _ = self.specs[key]
+        cache_path = self.cache_path(key)
+        try:
+            with open(cache_path, "rb") as f:
+                pixels = f.read()
+            if len(pixels) == size[0] * size[1] * 4:
+                return pixels
+        except OSError:
+            pass
+        image = pygame.transform.scale(pygame.image.load(path), size)
+        pixels = image_to_bytes(image, PIXEL_FORMAT)
+        self.write_cache(cache_path, pixels)
+        return pixels
+
+    def write_cache(self, cache_path, pixels):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(pixels)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass  # a read-only install just loses the cache
+
+    # Start decoding `keys` (default: everything registered) in the background; get() picks the results up
+    def preload(self, keys=None):
+        if self.pool is None:
+            return
+        with self.lock:
+            for key in self.specs if keys is None else keys:
+                if key not in self.surfaces and key not in self.pending:
+                    self.pending[key] = self.pool.submit(self.load_pixels, key)
+
+    def get(self, key):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            return surface
+        with self.lock:
+            future = self.pending.pop(key, None)
+        # Needed now but still queued behind other images: load it here instead of waiting
+        if future is not None and future.cancel():
+            future = None
+        pixels = future.result() if future is not None else self.load_pixels(key)
+        _, size, alpha = self.specs[key]
+        surface = image_from_bytes(pixels, size, PIXEL_FORMAT)
+        surface = surface.convert_alpha() if alpha else surface.convert()
+        self.surfaces[key] = surface
+        return surface
+
+    # Drop decoded surfaces that now live elsewhere (e.g. in an atlas); get() can reload them
+    def release(self, keys):
+        for key in keys:
+            self.surfaces.pop(key, None)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Dict-style view over one family of assets, e.g. CARDS[card] or WALLPAPERS["wood"]
+class AssetGroup:
+    def __init__(self, manager, prefix):
+        self.manager = manager
+        self.prefix = prefix
+
+    def register(self, name, path, size, alpha=True):
+        self.manager.register((self.prefix, name), path, size, alpha)
+
+    def __getitem__(self, name):
+        return self.manager.get((self.prefix, name))
+
+
+# Many same-sized images packed into one surface, drawn with area blits.
+# Pixels are copied exactly (BLEND_RGBA_MAX onto a transparent sheet), then the
+# sheet is converted to the display format once. The default single column keeps
+# each image's rows next to each other in memory, which software blits prefer.
+class TextureAtlas:
+    def __init__(self, surfaces, cell_size, columns=1):
+        self.cell_size = cell_size
+        keys = list(surfaces)
+        rows = -(-len(keys) // columns)
+        sheet = pygame.Surface((cell_size[0] * columns, cell_size[1] * rows), pygame.SRCALPHA)
+        sheet.fill((0, 0, 0, 0))
+        self.areas = {}
+        for i, key in enumerate(keys):
+            area = pygame.Rect((i % columns) * cell_size[0], (i // columns) * cell_size[1], *cell_size)
+            sheet.blit(surfaces[key], area, special_flags=pygame.BLEND_RGBA_MAX)
+            self.areas[key] = area
+        self.sheet = sheet.convert_alpha() if pygame.display.get_surface() else sheet
+
+    def blit(self, target, key, position):
+        target.blit(self.sheet, position, self.areas[key])
+
+    # Draw many (key, position) pairs with a single Surface.blits call
+    def blits(self, target, items):
+        sheet, areas = self.sheet, self.areas
+        target.blits([(sheet, position, areas[key]) for key, position in items], False)
@@ -0,0 +1,88 @@
+# Draw 1,000 hands from separate card surfaces and from the card atlas
+#
+#   python benchmarks/bench_atlas.py [--hands 1000] [--cards 5]
+#
+# Uses synthetic card surfaces (no assets needed) and SDL's dummy video driver
+# unless SDL_VIDEODRIVER is already set.
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+from assets import TextureAtlas
+from cards import CARD_COUNT
+
+CARD_SIZE = (150, 210)
+SCREEN_SIZE = (1920, 1080)
+
+
+def make_cards(rng):
+    cards = {}
+    for key in list(range(CARD_COUNT)) + ["back"]:
+        surface = pygame.Surface(CARD_SIZE, pygame.SRCALPHA)
+        surface.fill((rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+        pygame.draw.rect(surface, (0, 0, 0, 0), (0, 0, *CARD_SIZE), 3, border_radius=8)
+        cards[key] = surface.convert_alpha()
+    return cards
+
+
+# Same fanned layout as Blackjack.draw_state, for `hands` random hands
+def make_layouts(rng, hands, cards_per_hand):
+    layouts = []
+    for _ in range(hands):
+        offset = min(80, 400 // cards_per_hand)
+        start_x = SCREEN_SIZE[0] // 2 - (cards_per_hand * offset) // 2
+        layouts.append([(rng.randrange(CARD_COUNT), (start_x + i * offset, SCREEN_SIZE[1] - 250))
+                        for i in range(cards_per_hand)])
+    return layouts
+
+
+def draw_separate(screen, cards, layouts):
+    for items in layouts:
+        for key, position in items:
+            screen.blit(cards[key], position)
+
+
+def draw_atlas(screen, atlas, layouts):
+    for items in layouts:
+        atlas.blits(screen, items)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-card blits with batched atlas blits")
+    parser.add_argument("--hands", type=int, default=1000)
+    parser.add_argument("--cards", type=int, default=5, help="cards per hand")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    rng = random.Random(args.seed)
+    cards = make_cards(rng)
+    atlas = TextureAtlas(cards, CARD_SIZE)
+    layouts = make_layouts(rng, args.hands, args.cards)
+
+    separate = min(timed(draw_separate, screen, cards, layouts) for _ in range(args.repeat))
+    batched = min(timed(draw_atlas, screen, atlas, layouts) for _ in range(args.repeat))
+    print(f"{args.hands:,} hands x {args.cards} cards, best of {args.repeat}")
+    print(f"  separate surfaces: {separate * 1000:8.1f} ms ({separate / args.hands * 1e6:.1f} us/hand)")
+    print(f"  atlas blits:       {batched * 1000:8.1f} ms ({batched / args.hands * 1e6:.1f} us/hand)")
+    print(f"  speedup: {separate / batched:.2f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
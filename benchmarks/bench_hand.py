@@ -0,0 +1,73 @@
+# Micro-benchmark: old string-card calculate_hand vs the incremental cards.Hand
+#
+#   python benchmarks/bench_hand.py
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cards import CARD_NAMES, FULL_DECK, Hand
+
+
+# The scoring code Blackjack used before the integer card encoding
+def legacy_card_value(card):
+    value = card.split("_")[0]
+    if value in ["jack", "queen", "king"]:
+        return 10
+    elif value == "ace":
+        return 11
+    return int(value)
+
+
+def legacy_calculate_hand(hand):
+    score = 0
+    aces = 0
+    for card in hand:
+        value = legacy_card_value(card)
+        if value == 11:
+            aces += 1
+        score += value
+    while score > 21 and aces:
+        score -= 10
+        aces -= 1
+    return score
+
+
+def main():
+    rng = random.Random(1)
+    deals = [rng.sample(FULL_DECK, rng.randint(2, 6)) for _ in range(1000)]
+    legacy_hands = [[CARD_NAMES[card] for card in cards] for cards in deals]
+    hands = [Hand(cards) for cards in deals]
+    assert [legacy_calculate_hand(hand) for hand in legacy_hands] == [hand.total for hand in hands]
+
+    # Scoring an existing hand, as draw() does every frame
+    legacy = min(timeit.repeat(lambda: [legacy_calculate_hand(hand) for hand in legacy_hands], number=100, repeat=5))
+    new = min(timeit.repeat(lambda: [hand.total for hand in hands], number=100, repeat=5))
+    calls = 100 * len(deals)
+    print(f"score hand:  legacy {calls / legacy:>12,.0f}/s   new {calls / new:>12,.0f}/s   {legacy / new:.1f}x")
+
+    # Building a hand card by card and scoring after every card, as dealer_play does
+    def legacy_build():
+        for cards in legacy_hands:
+            hand = []
+            for card in cards:
+                hand.append(card)
+                legacy_calculate_hand(hand)
+
+    def new_build():
+        for cards in deals:
+            hand = Hand()
+            for card in cards:
+                hand.append(card)
+                hand.total
+
+    legacy = min(timeit.repeat(legacy_build, number=20, repeat=5))
+    new = min(timeit.repeat(new_build, number=20, repeat=5))
+    calls = 20 * len(deals)
+    print(f"build hand:  legacy {calls / legacy:>12,.0f}/s   new {calls / new:>12,.0f}/s   {legacy / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
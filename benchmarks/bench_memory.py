@@ -0,0 +1,99 @@
+# Memory per table session and per hand, measured with tracemalloc
+#
+#   python benchmarks/bench_memory.py [--count 5000]
+#
+# Builds `count` of each object, keeps them all alive and reports the traced
+# bytes each one holds: engine tables idle after a round (what a server keeps per
+# table), game sessions (what the pygame front end keeps per player; its widgets
+# exist once per process and are reported separately), live hands, settled round
+# results and archived hands decoded from the hand history. Run from the game
+# directory; saves and hand history go to a temporary directory.
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BlackJack
+from cards import Hand
+from engine import INSURANCE, PLAYING, BlackjackEngine
+from history import decode_record, encode_record
+from replay import isolate
+
+
+# Bet on every seat and play the round out like the dealer, then clear the table
+def play_round(engine, bet=10):
+    for seat in range(len(engine.seats)):
+        engine.place_bet(bet, seat)
+    engine.deal()
+    while engine.state == INSURANCE:
+        engine.decline_insurance()
+    while engine.state == PLAYING:
+        if engine.active_hand.total < 17:
+            engine.hit()
+        else:
+            engine.stand()
+    results = engine.last_results
+    engine.next_round()
+    return results
+
+
+def idle_table(seats):
+    def make(seed):
+        engine = BlackjackEngine(seed=seed, seats=seats)
+        play_round(engine)
+        return engine
+    return make
+
+
+def round_result(seed):
+    return play_round(BlackjackEngine(seed=seed))[0]
+
+
+def archived_hand(seed):
+    result = round_result(seed)
+    data = encode_record(seed, result.seed, 0.0, result.balance, result.bet, result.delta, result.shuffles,
+                         result.position, result.outcome, result.player_cards, result.dealer_cards, result.actions)
+    return decode_record(data)
+
+
+# Average traced bytes held by each of `count` objects from `make(i)`
+def bytes_each(make, count):
+    make(0)  # warm up caches such as the compiled rule tables
+    gc.collect()
+    tracemalloc.start()
+    items = [make(i) for i in range(count)]
+    traced = tracemalloc.get_traced_memory()[0] - sys.getsizeof(items)
+    tracemalloc.stop()
+    return traced / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per table session and per hand")
+    parser.add_argument("--count", type=int, default=5000, help="objects built per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        isolate(directory)
+        cases = [("per session", "engine table, 1 seat", idle_table(1)),
+                 ("per session", "engine table, 7 seats", idle_table(7)),
+                 ("per session", "game session", lambda seed: BlackJack.TableSession(seed)),
+                 ("per process", "game front end", lambda seed: BlackJack.Blackjack(BlackJack.TableSession(seed))),
+                 ("per hand", "live hand, 3 cards", lambda seed: Hand([seed % 52, 20, 37])),
+                 ("per hand", "round result", round_result),
+                 ("per hand", "archived hand", archived_hand)]
+        print(f"{'':<12} {'':<24} {'bytes each':>11}")
+        for group, name, make in cases:
+            count = args.count if group != "per process" else max(1, args.count // 50)
+            print(f"{group:<12} {name:<24} {bytes_each(make, count):>11,.0f}")
+        BlackJack.PROFILES.close()
+        BlackJack.HISTORY.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Load test for server.py: many tables played concurrently over localhost
+#
+#   python benchmarks/bench_server.py [--tables 1000] [--connections 20] [--hands 20000] [--profiles DB]
+#
+# Starts a TableServer in this process unless --port points at a running one.
+# With --profiles every table plays its own profile, so each settled round is
+# also saved to the profile store (give the running server --profiles too).
+# Each table plays like the dealer (hit below 17) and every request's round trip
+# is timed; the report gives hands/s and the p50/p99 action latency.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import GAME_OVER, INSURANCE, PLAYING
+from profiles import ProfileStore
+from server import DEFAULT_HOST, Client, TableServer
+
+BET = 10
+BALANCE = 10 ** 9
+
+
+class LoadTest:
+    def __init__(self, hands):
+        self.hands = hands
+        self.played = 0
+        self.latencies = []
+
+    async def request(self, client, op, **fields):
+        start = time.perf_counter()
+        reply = await client.request(op, **fields)
+        self.latencies.append(time.perf_counter() - start)
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    async def play_table(self, client, profile=None):
+        fields = {"balance": BALANCE} if profile is None else {"profile": profile}
+        table = (await self.request(client, "open", **fields))["table"]
+        while self.played < self.hands:
+            view = await self.request(client, "bet", table=table, amount=BET)
+            if view["state"] == INSURANCE:
+                view = await self.request(client, "decline", table=table)
+            while view["state"] == PLAYING and view["player_total"] < 17:
+                view = await self.request(client, "hit", table=table)
+            # Busts and naturals settle without a stand
+            if view["state"] == PLAYING:
+                await self.request(client, "stand", table=table)
+            view = await self.request(client, "next", table=table)
+            if view["state"] == GAME_OVER:
+                await self.request(client, "reset", table=table, balance=BALANCE)
+            self.played += 1
+        await self.request(client, "close", table=table)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(args):
+    server = profiles = None
+    port = args.port
+    if port is None:
+        profiles = ProfileStore(args.profiles) if args.profiles else None
+        server = await TableServer(args.tables, profiles).start(DEFAULT_HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+    clients = [await Client.connect(args.host, port) for _ in range(args.connections)]
+    test = LoadTest(args.hands)
+    start = time.perf_counter()
+    await asyncio.gather(*(test.play_table(clients[i % len(clients)], f"bench-{i}" if args.profiles else None)
+                           for i in range(args.tables)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+    latencies = sorted(test.latencies)
+    print(f"{test.played:,} hands on {args.tables:,} tables over {args.connections} connections "
+          f"in {elapsed:.2f}s ({'in-process' if args.port is None else f'{args.host}:{port}'} server)")
+    print(f"  {test.played / elapsed:,.0f} hands/s, {len(latencies) / elapsed:,.0f} requests/s")
+    print(f"  latency p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    if profiles is not None:
+        profiles.close()
+        print(f"  {profiles.writes:,} profile rows saved in {profiles.transactions:,} transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Blackjack table server")
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--hands", type=int, default=20000)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=None, help="use a server that is already running")
+    parser.add_argument("--profiles", metavar="DB", help="play every table on a profile saved in this database")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
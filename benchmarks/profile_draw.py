@@ -0,0 +1,76 @@
+# Profile full redraws of every screen, with and without the text cache
+#
+#   python benchmarks/profile_draw.py [--frames 300] [--no-text-cache]
+#
+# Run from the game directory (it needs assets/). Uses SDL's dummy video driver
+# unless SDL_VIDEODRIVER is already set. Saves go to a temporary directory.
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import BlackJack
+from replay import isolate
+
+STATES = ["main_menu", "purchase", "wallpaper", "start", "betting", "playing", "result", "game_over"]
+ENGINE_STATES = ["betting", "playing", "result", "game_over"]
+
+
+# Put the engine straight into `state` without settling anything, so profiling
+# never touches the saved balance or the hand history
+def prepare(game, state):
+    game.reset(new_screen="table" if state in ENGINE_STATES else state)
+    engine = game.engine
+    if state in ["playing", "result"]:
+        engine.seats[0].bets[0] = 100
+        engine.deal_initial_cards()
+        engine.active = 0
+    if state == "result":
+        engine.dealer_play()
+        engine.active = None
+        game.result_message = "Player wins!"
+    if state in ENGINE_STATES:
+        engine.state = state
+        game.update_buttons()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile Blackjack.draw")
+    parser.add_argument("--frames", type=int, default=300, help="frames per state")
+    parser.add_argument("--no-text-cache", action="store_true", help="re-render all text every frame")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    if args.no_text_cache:
+        BlackJack.TEXT_CACHE.max_bytes = 0
+    game = BlackJack.game
+    profiler = cProfile.Profile()
+    total = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        isolate(directory)
+        for state in STATES:
+            prepare(game, state)
+            game.draw()  # build the static layer outside the measurement
+            start = time.perf_counter()
+            profiler.enable()
+            for _ in range(args.frames):
+                game.draw()
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            print(f"{state:<10} {elapsed * 1000 / args.frames:6.3f} ms/frame")
+        BlackJack.PROFILES.close()
+        BlackJack.HISTORY.close()
+    print(f"{'all':<10} {total * 1000 / (args.frames * len(STATES)):6.3f} ms/frame  "
+          f"(text cache hits {BlackJack.TEXT_CACHE.hits}, misses {BlackJack.TEXT_CACHE.misses})")
+    pstats.Stats(profiler).sort_stats("tottime").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
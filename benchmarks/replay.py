@@ -0,0 +1,271 @@
+# Replay recorded input sessions headlessly and report frame times per state
+#
+#   python benchmarks/replay.py [SESSION ...] [--repeat 5] [--no-alloc]
+#   python benchmarks/replay.py --regenerate
+#
+# Run from the game directory (it needs assets/). Uses SDL's dummy video driver
+# unless SDL_VIDEODRIVER is already set. Sessions (default: benchmarks/sessions/)
+# are recorded with `python BlackJack.py --record FILE`; --regenerate rebuilds
+# the scripted ones covering the menus, purchase and wallpaper screens and the
+# betting/playing/result flow. Each session is fed through update_loop frame by
+# frame, as fast as possible, on a fresh game started from its seed and saved
+# state: once to warm the asset and text caches, --repeat times timed, and once
+# more under tracemalloc for allocations. Every replay must end the same way or
+# the session is reported as diverged. Saves and hand history go to a
+# temporary directory.
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+import BlackJack
+from recorder import Recorder, load_session
+from rules import DOUBLE, SPLIT
+
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+DEFAULT_STATE = {"balance": 1000, "owned_wallpapers": ["default"], "current_wallpaper": "default"}
+
+
+# Keep replays away from the player's save and hand history, and turn the
+# game's quit into a flag so a recorded Exit click ends only that replay
+def isolate(directory):
+    BlackJack.open_storage(directory)
+    BlackJack.quit_game = lambda: setattr(BlackJack.game, "quit", True)
+
+
+def fingerprint():
+    game = BlackJack.game
+    return game.state, game.balance, tuple(game.stats.items()), BlackJack.CURRENT_WALLPAPER
+
+
+# Play `frames` on a fresh game; with `timings` or `allocations` (dicts keyed by
+# the state a frame started in) each frame's seconds or traced bytes are added
+async def replay(seed, state, frames, timings=None, allocations=None):
+    BlackJack.new_game(state, seed)
+    game = BlackJack.game
+    game.quit = False
+    for events in frames:
+        events = [event for event in events if event.type != pygame.QUIT]
+        state_name = game.state
+        if allocations is not None:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        await BlackJack.update_loop(events)
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings.setdefault(state_name, []).append(elapsed)
+        if allocations is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            allocations.setdefault(state_name, []).append((peak - before, current - before))
+        if game.quit:
+            break
+    return fingerprint()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_suite(paths, repeat, allocations):
+    timings = {}
+    traced = {} if allocations else None
+    print(f"{'session':<16} {'frames':>7} {'frames/s':>10} {'ms/frame':>9}  final state")
+    for path in paths:
+        seed, state, frames = load_session(path)
+        expected = await replay(seed, state, frames)
+        session_timings = {}
+        start = time.perf_counter()
+        results = [await replay(seed, state, frames, session_timings) for _ in range(repeat)]
+        elapsed = time.perf_counter() - start
+        if traced is not None:
+            tracemalloc.start()
+            results.append(await replay(seed, state, frames, allocations=traced))
+            tracemalloc.stop()
+        for name, values in session_timings.items():
+            timings.setdefault(name, []).extend(values)
+        played = sum(len(values) for values in session_timings.values())
+        status = "ok" if all(result == expected for result in results) else "DIVERGED"
+        print(f"{os.path.basename(path):<16} {played // repeat:>7} {played / elapsed:>10,.0f} "
+              f"{elapsed * 1000 / played:>9.3f}  {expected[0]}, ${expected[1]} {status}")
+
+    print(f"\n{'state':<12} {'frames':>7} {'ms/frame':>9} {'p50 ms':>8} {'p99 ms':>8}", end="")
+    print(f" {'peak KB/frame':>14} {'retained KB':>12}" if traced is not None else "")
+    for name, values in sorted(timings.items(), key=lambda item: -sum(item[1])):
+        line = (f"{name:<12} {len(values):>7} {sum(values) * 1000 / len(values):>9.3f} "
+                f"{percentile(values, 0.5) * 1000:>8.3f} {percentile(values, 0.99) * 1000:>8.3f}")
+        if traced is not None:
+            samples = traced.get(name, [(0, 0)])
+            line += (f" {sum(peak for peak, _ in samples) / len(samples) / 1024:>14.1f} "
+                     f"{sum(kept for _, kept in samples) / 1024:>12.1f}")
+        print(line)
+    total = [value for values in timings.values() for value in values]
+    print(f"{'all':<12} {len(total):>7} {sum(total) * 1000 / len(total):>9.3f}  ({len(total) / sum(total):,.0f} frames/s)")
+
+
+# Scripted input for --regenerate: pointer moves, clicks and key presses
+# recorded frame by frame exactly as the main loop would record a player
+class ScriptedSession:
+    def __init__(self, path, seed, state=DEFAULT_STATE):
+        BlackJack.new_game(state, seed)
+        self.recorder = Recorder(path, seed, state)
+        self.pos = (BlackJack.WIDTH // 2, BlackJack.HEIGHT // 2)
+
+    @property
+    def game(self):
+        return BlackJack.game
+
+    async def frame(self, *events):
+        self.recorder.record(list(events))
+        await BlackJack.update_loop(list(events))
+
+    async def move(self, target, steps=3):
+        for step in range(1, steps + 1):
+            pos = tuple(start + (end - start) * step // steps for start, end in zip(self.pos, target))
+            rel = (pos[0] - self.pos[0], pos[1] - self.pos[1])
+            self.pos = pos
+            await self.frame(pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=rel, buttons=(0, 0, 0)))
+
+    async def click(self, target):
+        if isinstance(target, str):
+            target = next(button for button in self.game.visible_buttons() if button.text == target)
+        await self.move(target.rect.center)
+        await self.frame(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=self.pos, button=1))
+        await self.frame(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=self.pos, button=1))
+
+    async def key(self, key, text=""):
+        await self.frame(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode=text, scancode=0))
+        await self.frame(pygame.event.Event(pygame.KEYUP, key=key, mod=0, scancode=0))
+
+    async def type(self, text):
+        for char in text:
+            await self.key(ord(char), char)
+
+
+async def menus_session(path):
+    session = ScriptedSession(path, seed=1)
+    game = session.game
+    for _ in range(3):
+        for button in game.main_menu_buttons:
+            await session.move(button.rect.center)
+        await session.click("Change Wallpaper")
+        await session.click(game.wallpaper_buttons[3])
+        await session.click("Buy")
+        await session.click(game.purchase_buttons[3])
+        await session.click("Start")
+        await session.click(game.start_button)
+        await session.click(game.main_menu_button)
+    return session
+
+
+async def purchase_session(path):
+    session = ScriptedSession(path, seed=2)
+    game = session.game
+    await session.click("Buy")
+    for amount in ["Buy 500", "Buy 2000"]:
+        await session.click(game.card_input)
+        await session.type("4111111111111111")
+        await session.click(game.exp_date_input)
+        await session.type("12/30")
+        await session.click(game.cvv_input)
+        await session.type("123")
+        await session.click(amount)
+    await session.click(game.card_input)
+    await session.type("1234")
+    await session.click("Buy 1000")
+    for _ in range(4):
+        await session.key(pygame.K_BACKSPACE)
+    await session.click(game.purchase_buttons[3])
+    return session
+
+
+async def wallpaper_session(path):
+    session = ScriptedSession(path, seed=3, state=dict(DEFAULT_STATE, balance=1200))
+    game = session.game
+    await session.click("Change Wallpaper")
+    for index in [1, 2, 0, 1, 2, 0]:  # buy wood, fail to afford marble, then switch between owned ones
+        await session.click(game.wallpaper_buttons[index])
+    await session.click(game.wallpaper_buttons[3])
+    await session.click("Start")
+    await session.click(game.start_button)
+    await session.click(game.main_menu_button)
+    return session
+
+
+# Rounds of betting and play: one seat, then three, doubling 10 and 11, splitting
+# aces and eights, hitting below 17, with clicks and keyboard shortcuts mixed
+async def table_session(path, rounds=40):
+    session = ScriptedSession(path, seed=4)
+    await session.click("Start")
+    await session.click(session.game.start_button)
+    for round_number in range(rounds):
+        game = session.game
+        if round_number == rounds // 2:
+            await session.key(pygame.K_3, "3")
+        await session.click("Bet 50")
+        if game.state == "insurance":
+            await session.click("No Insurance")
+        while game.state in ["insurance", "playing"]:
+            hand = game.engine.active_hand
+            allowed = game.engine.allowed_actions()
+            if allowed & 1 << SPLIT and BlackJack.CARD_VALUES[hand[0]] in [8, 11]:
+                await session.key(pygame.K_p, "p")
+            elif allowed & 1 << DOUBLE and hand.total in [10, 11]:
+                await session.click("Double")
+            elif game.state == "insurance":
+                await session.key(pygame.K_n, "n")
+            elif hand.total < 17:
+                await session.click("Hit") if round_number % 2 else await session.key(pygame.K_SPACE, " ")
+            else:
+                await session.click("Stand") if round_number % 2 else await session.key(pygame.K_RETURN, "\r")
+        await session.click("Play Again")
+        if game.state == "game_over":
+            await session.click("Reset Game")
+            await session.click("Start")
+            await session.click(session.game.start_button)
+    return session
+
+
+SCRIPTED_SESSIONS = {"menus": menus_session, "purchase": purchase_session, "wallpaper": wallpaper_session,
+                     "table": table_session}
+
+
+async def regenerate():
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    for name, script in SCRIPTED_SESSIONS.items():
+        session = await script(os.path.join(SESSION_DIR, f"{name}.json"))
+        session.recorder.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headlessly and time every frame")
+    parser.add_argument("sessions", nargs="*", help="session files (default: benchmarks/sessions/*.json)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed replays per session")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc replay")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the scripted sessions and exit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        isolate(directory)
+        if args.regenerate:
+            asyncio.run(regenerate())
+        else:
+            paths = args.sessions or sorted(glob.glob(os.path.join(SESSION_DIR, "*.json")))
+            asyncio.run(run_suite(paths, args.repeat, not args.no_alloc))
+        BlackJack.PROFILES.close()
+        BlackJack.HISTORY.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Table capacity planning: hands per shoe and per hour for 1 to 7 seats
+#
+#   python capacity.py [--rounds 20000] [--seed 1] [--stand-on 17]
+#
+# Plays rounds headlessly on BlackjackEngine with every seat betting, declining
+# insurance and hitting below --stand-on, reads the engine's throughput counters, and turns cards and
+# decisions per round into hands per hour with a simple dealing-time model. The
+# timings are rough live-table figures; override them to match a real table.
+import argparse
+import time
+
+from engine import INSURANCE, MAX_SEATS, PLAYING, BlackjackEngine
+from rules import DEALER_STAND_TOTAL
+
+ROUND_SECONDS = 12.0  # bets, sweep and payouts per round
+CARD_SECONDS = 1.5  # per card dealt
+DECISION_SECONDS = 2.5  # per hit or stand
+SHUFFLE_SECONDS = 90.0  # per reshuffle
+
+
+# Play `rounds` rounds with `seats` seats and return the engine and the number of player decisions
+def play_rounds(seats, rounds, seed=None, stand_on=DEALER_STAND_TOTAL):
+    engine = BlackjackEngine(balance=10 ** 12, seed=seed, seats=seats)
+    decisions = 0
+    for _ in range(rounds):
+        for seat in range(seats):
+            engine.place_bet(1, seat)
+        engine.deal()
+        while engine.state == INSURANCE:
+            decisions += 1
+            engine.decline_insurance()
+        while engine.state == PLAYING:
+            decisions += 1
+            if engine.active_hand.total < stand_on:
+                engine.hit()
+            else:
+                engine.stand()
+        engine.next_round()
+    return engine, decisions
+
+
+def hands_per_hour(engine, decisions, round_seconds=ROUND_SECONDS, card_seconds=CARD_SECONDS,
+                   decision_seconds=DECISION_SECONDS, shuffle_seconds=SHUFFLE_SECONDS):
+    throughput = engine.throughput
+    seconds = (throughput["rounds"] * round_seconds + throughput["cards"] * card_seconds
+               + decisions * decision_seconds + engine.shoe.shuffles * shuffle_seconds)
+    return throughput["hands"] * 3600 / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hands per shoe and per hour by number of seats")
+    parser.add_argument("--rounds", type=int, default=20000, help="rounds played per seat count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stand-on", type=int, default=DEALER_STAND_TOTAL)
+    parser.add_argument("--round-seconds", type=float, default=ROUND_SECONDS)
+    parser.add_argument("--card-seconds", type=float, default=CARD_SECONDS)
+    parser.add_argument("--decision-seconds", type=float, default=DECISION_SECONDS)
+    parser.add_argument("--shuffle-seconds", type=float, default=SHUFFLE_SECONDS)
+    args = parser.parse_args()
+
+    print(f"{'seats':>5} {'hands/shoe':>11} {'cards/round':>12} {'rounds/hour':>12} {'hands/hour':>11} "
+          f"{'engine rounds/s':>16}")
+    for seats in range(1, MAX_SEATS + 1):
+        start = time.perf_counter()
+        engine, decisions = play_rounds(seats, args.rounds, args.seed, args.stand_on)
+        elapsed = time.perf_counter() - start
+        throughput = engine.throughput
+        hourly = hands_per_hour(engine, decisions, args.round_seconds, args.card_seconds, args.decision_seconds,
+                                args.shuffle_seconds)
+        per_shoe = engine.hands_per_shoe()
+        print(f"{seats:>5} {per_shoe or 0:>11.1f} {throughput['cards'] / throughput['rounds']:>12.1f} "
+              f"{hourly / seats:>12.0f} {hourly:>11.0f} {throughput['rounds'] / elapsed:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# Compact integer card model shared by the game and the headless tools
+#
+# A card is one small int: rank in the high bits, suit in the low two bits.
+# The "value_of_suit" name is only derived when an image key is needed.
+
+import random
+from array import array
+
+from rules import BLACKJACK, DEFAULT_DECKS, DEFAULT_PENETRATION
+
+SUITS = ["hearts", "diamonds", "clubs", "spades"]
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "jack", "queen", "king", "ace"]
+RANK_VALUES = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11]
+ACE = RANKS.index("ace")
+
+CARD_COUNT = len(RANKS) * len(SUITS)
+FULL_DECK = list(range(CARD_COUNT))
+
+
+def make_card(rank, suit):
+    return rank << 2 | suit
+
+
+def card_rank(card):
+    return card >> 2
+
+
+def card_suit(card):
+    return card & 3
+
+
+# Lookup tables indexed by card
+CARD_VALUES = [RANK_VALUES[card_rank(card)] for card in FULL_DECK]
+CARD_NAMES = [f"{RANKS[card_rank(card)]}_of_{SUITS[card_suit(card)]}" for card in FULL_DECK]
+CARDS_BY_NAME = {name: card for card, name in enumerate(CARD_NAMES)}
+# Hi-Lo count tag (+1 for 2-6, -1 for tens and aces) and composition slot (aces,
+# 2..9, then all ten-valued cards, as in dealer_odds) of each card
+HI_LO = [1 if value <= 6 else -1 if value >= 10 else 0 for value in CARD_VALUES]
+VALUE_SLOTS = [0 if value == 11 else value - 1 for value in CARD_VALUES]
+SLOT_COUNT = 10
+
+
+# A hand keeps its running total and the number of aces still counted as 11,
+# so appending a card and reading the score are both O(1). Cards are kept in a
+# bytearray and the attributes in slots, so a server can hold many thousands.
+class Hand:
+    __slots__ = ("cards", "total", "soft_aces")
+
+    def __init__(self, cards=()):
+        self.cards = bytearray()
+        self.total = 0
+        self.soft_aces = 0
+        for card in cards:
+            self.append(card)
+
+    def append(self, card):
+        value = CARD_VALUES[card]
+        self.cards.append(card)
+        self.total += value
+        if value == 11:
+            self.soft_aces += 1
+        while self.total > BLACKJACK and self.soft_aces:
+            self.total -= 10
+            self.soft_aces -= 1
+
+    def is_soft(self):
+        return self.soft_aces > 0
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, index):
+        return self.cards[index]
+
+
+# A multi-deck shoe with a cut card. The cards live in one preallocated array
+# and `position` moves through it; each deal swaps a random undealt card to the
+# position (a lazy Fisher-Yates shuffle), so reshuffling just resets the position.
+#
+# The Hi-Lo running count and the composition of the undealt cards are updated
+# as each card is dealt and reset on reshuffle, so reading them is O(1).
+class Shoe:
+    __slots__ = ("decks", "cards", "cut", "rng", "position", "round_start", "shuffles", "full_composition",
+                 "running_count", "composition")
+
+    def __init__(self, decks=DEFAULT_DECKS, penetration=DEFAULT_PENETRATION, rng=None):
+        self.decks = decks
+        self.cards = array("B", FULL_DECK * decks)
+        self.cut = int(len(self.cards) * penetration)
+        self.rng = rng or random.Random()
+        self.position = 0
+        self.round_start = 0
+        self.shuffles = 0
+        self.full_composition = array("H", [0] * SLOT_COUNT)
+        for card in self.cards:
+            self.full_composition[VALUE_SLOTS[card]] += 1
+        self.reset_count()
+
+    def reset_count(self):
+        self.running_count = 0
+        self.composition = array("H", self.full_composition)
+
+    def shuffle(self):
+        self.position = 0
+        self.round_start = 0
+        self.shuffles += 1
+        self.reset_count()
+
+    def needs_shuffle(self):
+        return self.position >= self.cut
+
+    # Called before each round: reshuffle once the cut card has come out
+    def start_round(self):
+        if self.needs_shuffle():
+            self.shuffle()
+        self.round_start = self.position
+
+    def remaining(self):
+        return len(self.cards) - self.position
+
+    # Running count per deck still in the shoe
+    def true_count(self):
+        return self.running_count * CARD_COUNT / self.remaining()
+
+    def deal(self):
+        if self.position >= len(self.cards):
+            self.reshuffle_discards()
+        cards = self.cards
+        top = self.position
+        pick = top + int(self.rng.random() * (len(cards) - top))
+        card = cards[pick]
+        cards[pick] = cards[top]
+        cards[top] = card
+        self.position = top + 1
+        self.running_count += HI_LO[card]
+        self.composition[VALUE_SLOTS[card]] -= 1
+        return card
+
+    # Ran out mid-round: keep the cards on the table and shuffle the discards back in
+    def reshuffle_discards(self):
+        in_play = self.cards[self.round_start:]
+        self.cards[len(in_play):] = self.cards[:self.round_start]
+        self.cards[:len(in_play)] = in_play
+        self.position = self.round_start = len(in_play)
+        self.shuffles += 1
+        # Only the cards still on the table have been seen in the new shoe
+        self.reset_count()
+        for card in in_play:
+            self.running_count += HI_LO[card]
+            self.composition[VALUE_SLOTS[card]] -= 1
@@ -0,0 +1,113 @@
+# Exact dealer final-total probabilities, the analytic counterpart of Blackjack.dealer_play
+#
+# A shoe composition is a tuple of 10 counts by card value: aces, 2..9, then all
+# ten-valued cards. Results are (P17, P18, P19, P20, P21, Pbust). With
+# `hits_soft_17` the dealer draws to soft 17 (the H17 rule in rules.Rules).
+import argparse
+import time
+from functools import lru_cache
+
+from cards import CARD_VALUES
+from rules import BLACKJACK, DEALER_STAND_TOTAL, DEFAULT_DECKS
+
+FINAL_TOTALS = ["17", "18", "19", "20", "21", "bust"]
+BUST = len(FINAL_TOTALS) - 1
+# Card value of each composition slot (aces counted as 1)
+SLOT_VALUES = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+INFINITE_DECK = [1 / 13] * 9 + [4 / 13]
+
+
+def value_slot(value):
+    return 0 if value in (1, 11) else value - 1
+
+
+def deck_composition(decks=DEFAULT_DECKS):
+    counts = [0] * len(SLOT_VALUES)
+    for value in CARD_VALUES:
+        counts[value_slot(value)] += decks
+    return tuple(counts)
+
+
+# Composition of the undealt part of a cards.Shoe, kept up to date by the shoe itself
+def shoe_composition(shoe):
+    return tuple(shoe.composition)
+
+
+def final_slot(hard, has_ace, hits_soft_17):
+    soft = has_ace and hard + 10 <= BLACKJACK
+    total = hard + 10 if soft else hard
+    if total > BLACKJACK:
+        return BUST
+    if total == DEALER_STAND_TOTAL and soft and hits_soft_17:
+        return None
+    if total >= DEALER_STAND_TOTAL:
+        return total - DEALER_STAND_TOTAL
+    return None
+
+
+def add_outcomes(result, weight, outcomes):
+    for i, p in enumerate(outcomes):
+        result[i] += weight * p
+
+
+# Infinite deck: every draw has the same odds, so the state is just the hand
+@lru_cache(maxsize=None)
+def infinite_outcomes(hard, has_ace, hits_soft_17=False):
+    slot = final_slot(hard, has_ace, hits_soft_17)
+    if slot is not None:
+        return tuple(1.0 if i == slot else 0.0 for i in range(len(FINAL_TOTALS)))
+    result = [0.0] * len(FINAL_TOTALS)
+    for value, p in zip(SLOT_VALUES, INFINITE_DECK):
+        add_outcomes(result, p, infinite_outcomes(hard + value, has_ace or value == 1, hits_soft_17))
+    return tuple(result)
+
+
+# Finite shoe: recurse over the remaining counts, memoized on the hand and the
+# composition tuple so identical sub-shoes reached by different draw orders are shared
+@lru_cache(maxsize=1 << 18)
+def finite_outcomes(hard, has_ace, counts, hits_soft_17=False):
+    slot = final_slot(hard, has_ace, hits_soft_17)
+    if slot is not None:
+        return tuple(1.0 if i == slot else 0.0 for i in range(len(FINAL_TOTALS)))
+    remaining = sum(counts)
+    result = [0.0] * len(FINAL_TOTALS)
+    for i, count in enumerate(counts):
+        if count:
+            value = SLOT_VALUES[i]
+            drawn = counts[:i] + (count - 1,) + counts[i + 1:]
+            add_outcomes(result, count / remaining,
+                         finite_outcomes(hard + value, has_ace or value == 1, drawn, hits_soft_17))
+    return tuple(result)
+
+
+# Final-total distribution for a dealer showing `upcard_value` (2-11). `counts` is
+# the composition of the cards still in the shoe, upcard already removed, or None
+# for an infinite deck.
+def dealer_probabilities(upcard_value, counts=None, hits_soft_17=False):
+    hard = 1 if upcard_value == 11 else upcard_value
+    if counts is None:
+        return infinite_outcomes(hard, upcard_value == 11, hits_soft_17)
+    return finite_outcomes(hard, upcard_value == 11, tuple(counts), hits_soft_17)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact dealer final-total probabilities per upcard")
+    parser.add_argument("--decks", type=int, default=DEFAULT_DECKS, help="0 for an infinite deck")
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17")
+    args = parser.parse_args()
+
+    print("up   " + "".join(f"{name:>8}" for name in FINAL_TOTALS))
+    start = time.perf_counter()
+    for upcard in range(2, 12):
+        counts = None
+        if args.decks:
+            counts = list(deck_composition(args.decks))
+            counts[value_slot(upcard)] -= 1
+        probabilities = dealer_probabilities(upcard, counts, args.h17)
+        label = "A" if upcard == 11 else str(upcard)
+        print(f"{label:<5}" + "".join(f"{p:>8.4f}" for p in probabilities))
+    print(f"computed in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+# Blackjack rules engine: one table's shoe, seats, bets and balance as a state machine
+#
+# Pure Python on top of cards.py and rules.py; it never imports pygame or touches
+# the display or the filesystem, so the game, the hand-history replay and servers
+# all drive the same code. Anything that should happen when a round settles
+# (saving, history, analytics) subscribes with add_listener().
+#
+# A table has 1 to MAX_SEATS seats sharing one shoe, one dealer hand and one
+# balance. Seats with a bet are dealt in, play in order, and are all settled in
+# one pass against the dealer's final total.
+#
+# Table rules (dealer soft 17, blackjack payout, doubling, splitting, surrender,
+# insurance) come from a rules.Rules value; which actions a hand may take and how
+# an outcome pays are lookups in its compiled rule_tables().
+import random
+from collections import namedtuple
+
+from cards import CARD_VALUES, Hand, Shoe
+from rules import (ACTION_NAMES, BLACKJACK, DEFAULT_RULES, DOUBLE, FINISHED, FIRST_DECISION, HANDS_FULL, HIT,
+                   INSURANCE_RETURN, INSURE, NATURAL_OUTCOMES, NO_INSURANCE, OUTCOME_STATS, PAIR, SPLIT, SPLIT_ACES,
+                   SPLIT_HAND, STAND, SURRENDER, hand_outcome, rule_tables)
+
+BETTING, INSURANCE, PLAYING, RESULT, GAME_OVER = "betting", "insurance", "playing", "result", "game_over"
+STARTING_BALANCE = 1000
+MAX_SEATS = 7
+
+RoundResult = namedtuple("RoundResult", ["seed", "player_cards", "dealer_cards", "bet", "actions", "outcome",
+                                         "delta", "balance", "shuffles", "position", "seat"])
+
+
+# An action that the current state does not allow, e.g. hitting before the deal
+class EngineError(Exception):
+    pass
+
+
+# One seat's hands: a single hand until it splits, each hand with its own bet
+class Seat:
+    __slots__ = ("hands", "bets", "current", "cards", "stake", "insurance", "split_aces", "surrendered", "actions",
+                 "outcomes", "outcome")
+
+    def __init__(self):
+        self.hands = [Hand()]
+        self.bets = [0]
+        self.current = 0  # the hand being played
+        self.cards = bytearray()  # every card dealt to the seat, in deal order
+        self.stake = 0  # chips bet; doubles, splits and insurance come on top
+        self.insurance = 0
+        self.split_aces = False
+        self.surrendered = False
+        self.actions = bytearray()
+        self.outcomes = []
+        self.outcome = None
+
+    # The first hand, the only one unless the seat split
+    @property
+    def hand(self):
+        return self.hands[0]
+
+    @property
+    def bet(self):
+        return sum(self.bets)
+
+
+# betting --deal--> [insurance -->] playing --last hand done--> result --next_round--> betting (or game_over when broke)
+#
+# Engines, seats, hands and the shoe all use slots and keep cards in bytearrays,
+# so a server can hold many idle tables; RoundResult cards are bytes as well.
+class BlackjackEngine:
+    __slots__ = ("seed", "rng", "rules", "tables", "naturals", "shoe", "balance", "stats", "throughput", "listeners",
+                 "last_results", "seats", "dealer_hand", "active", "state", "counted_shuffles")
+
+    def __init__(self, balance=STARTING_BALANCE, seed=None, rules=DEFAULT_RULES, shoe=None, seats=1):
+        # Own RNG instead of the global one so a seeded game can be reproduced;
+        # the seed is kept for the hand history
+        self.seed = seed if seed is not None else random.getrandbits(63)
+        self.rng = random.Random(self.seed)
+        self.rules = rules
+        self.tables = rule_tables(rules)
+        self.naturals = rules.blackjack_payout is not None
+        self.shoe = shoe
+        self.balance = balance
+        self.stats = {"games": 0, "wins": 0, "losses": 0, "pushes": 0}
+        # Table throughput: rounds and hands played, cards used, and hands per finished shoe
+        self.throughput = {"rounds": 0, "hands": 0, "cards": 0, "shoes": 0, "shoe_hands": 0}
+        self.listeners = []
+        self.last_results = []
+        if not 1 <= seats <= MAX_SEATS:
+            raise EngineError(f"a table has 1 to {MAX_SEATS} seats")
+        self.seats = [Seat() for _ in range(seats)]
+        self.new_round()
+        if shoe is None:
+            self.create_deck()
+        self.counted_shuffles = self.shoe.shuffles
+
+    # `callback(engine, results)` runs after every settled round with one RoundResult per seat played
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def require(self, action, *states):
+        if self.state not in states:
+            raise EngineError(f"cannot {action} while {self.state}")
+
+    # The shoe is built once and only reshuffled when its cut card comes out
+    def create_deck(self):
+        self.shoe = Shoe(self.rules.decks, self.rules.penetration, self.rng)
+
+    # Seat 0 is the whole table for single-seat callers
+    @property
+    def player_hand(self):
+        return self.seats[0].hand
+
+    @property
+    def actions(self):
+        return self.seats[0].actions
+
+    @property
+    def outcome(self):
+        return self.seats[0].outcome
+
+    # Total staked across all seats
+    @property
+    def bet(self):
+        return sum(seat.bet for seat in self.seats)
+
+    # The seat whose turn it is while deciding on insurance or playing, else None
+    @property
+    def active_seat(self):
+        return self.seats[self.active] if self.active is not None else None
+
+    @property
+    def active_hand(self):
+        seat = self.active_seat
+        return seat.hands[seat.current] if seat is not None else None
+
+    def seats_in_round(self):
+        return [index for index, seat in enumerate(self.seats) if seat.bet or seat.hand.cards]
+
+    def set_seats(self, count):
+        self.require("change seats", BETTING)
+        if not 1 <= count <= MAX_SEATS:
+            raise EngineError(f"a table has 1 to {MAX_SEATS} seats")
+        if any(seat.bet for seat in self.seats[count:]):
+            raise EngineError("cannot remove a seat with a bet on it")
+        self.seats = self.seats[:count] + [Seat() for _ in range(count - len(self.seats))]
+
+    # Clear the table for the next bet. A bet that was placed but not settled is forfeited.
+    def new_round(self):
+        self.seats = [Seat() for _ in self.seats]
+        self.dealer_hand = Hand()
+        self.active = None
+        self.state = BETTING
+
+    # Chips can be added before the deal, or while playing to a seat that has not
+    # split, has not insured and whose turn has not passed (insurance was priced
+    # on the stake at the time); returns False if the balance is too low
+    def place_bet(self, amount, seat=0):
+        self.require("bet", BETTING, PLAYING)
+        if amount <= 0:
+            raise EngineError(f"invalid bet {amount}")
+        if not 0 <= seat < len(self.seats):
+            raise EngineError(f"no seat {seat}")
+        target = self.seats[seat]
+        if self.state == PLAYING:
+            if not target.hand.cards:
+                raise EngineError(f"seat {seat} is not in this round")
+            if len(target.hands) > 1 or target.insurance or seat < self.active:
+                raise EngineError(f"seat {seat} cannot take more chips now")
+        if amount > self.balance:
+            return False
+        target.bets[0] += amount
+        target.stake += amount
+        self.balance -= amount
+        return True
+
+    def deal(self):
+        self.require("deal", BETTING)
+        if not self.bet:
+            raise EngineError("cannot deal without a bet")
+        self.deal_initial_cards()
+        self.active = self.seats_in_round()[0]
+        if self.naturals and self.rules.insurance and CARD_VALUES[self.dealer_hand[0]] == 11:
+            self.state = INSURANCE
+        else:
+            self.state = PLAYING
+            self.peek()
+
+    # Two cards to each seat with a bet, in seat order, then two to the dealer
+    def deal_initial_cards(self):
+        self.shoe.start_round()
+        for seat in self.seats:
+            if seat.bet:
+                seat.cards = bytearray([self.shoe.deal(), self.shoe.deal()])
+                seat.hands = [Hand(seat.cards)]
+                seat.actions = bytearray()
+        self.dealer_hand = Hand([self.shoe.deal(), self.shoe.deal()])
+
+    def draw(self, seat, hand):
+        card = self.shoe.deal()
+        hand.append(card)
+        seat.cards.append(card)
+
+    def is_natural(self, hand):
+        return self.naturals and len(hand.cards) == 2 and hand.total == BLACKJACK
+
+    # When naturals pay extra the dealer checks for one before anyone plays; a
+    # dealer natural settles the round at once
+    def peek(self):
+        if self.is_natural(self.dealer_hand):
+            self.finish_round()
+        else:
+            self.advance()
+
+    # Insurance is offered seat by seat when the dealer shows an ace; it costs half
+    # the seat's bet and returns False if the balance is too low
+    def insure(self):
+        self.require("insure", INSURANCE)
+        seat = self.active_seat
+        amount = seat.stake // 2
+        if amount > self.balance:
+            return False
+        self.balance -= amount
+        seat.insurance = amount
+        seat.actions.append(INSURE)
+        self.next_insurance_seat()
+        return True
+
+    def decline_insurance(self):
+        self.require("decline insurance", INSURANCE)
+        self.active_seat.actions.append(NO_INSURANCE)
+        self.next_insurance_seat()
+
+    def next_insurance_seat(self):
+        later = [index for index in self.seats_in_round() if index > self.active]
+        if later:
+            self.active = later[0]
+            return
+        self.active = self.seats_in_round()[0]
+        self.state = PLAYING
+        self.peek()
+
+    # Bit mask (1 << action code) of the actions the rules allow for the seat's current hand
+    def hand_actions(self, seat):
+        hand = seat.hands[seat.current]
+        situation = 0
+        if len(hand.cards) == 2:
+            situation |= FIRST_DECISION
+            if CARD_VALUES[hand.cards[0]] == CARD_VALUES[hand.cards[1]]:
+                situation |= PAIR
+        if len(seat.hands) > 1:
+            situation |= SPLIT_HAND
+        elif self.is_natural(hand):
+            situation |= FINISHED
+        if seat.split_aces:
+            situation |= SPLIT_ACES
+        if len(seat.hands) >= self.rules.max_split_hands:
+            situation |= HANDS_FULL
+        if hand.total > BLACKJACK:
+            situation |= FINISHED
+        return self.tables.actions[situation]
+
+    # What the active seat may do right now, as a bit mask of action codes
+    def allowed_actions(self):
+        if self.state == INSURANCE:
+            return 1 << INSURE | 1 << NO_INSURANCE
+        if self.state != PLAYING:
+            return 0
+        seat = self.active_seat
+        allowed = self.hand_actions(seat)
+        if seat.bets[seat.current] > self.balance:
+            allowed &= ~(1 << DOUBLE | 1 << SPLIT)
+        return allowed
+
+    def can(self, action):
+        return bool(self.allowed_actions() & 1 << action)
+
+    def check(self, action):
+        self.require(ACTION_NAMES[action], PLAYING)
+        if not self.can(action):
+            raise EngineError(f"cannot {ACTION_NAMES[action]} this hand")
+
+    # Apply an action code (as stored in the hand history)
+    def act(self, action):
+        method = ENGINE_ACTIONS.get(action)
+        if method is None:
+            raise EngineError(f"unknown action {action}")
+        return method(self)
+
+    def hit(self):
+        self.check(HIT)
+        seat = self.active_seat
+        seat.actions.append(HIT)
+        self.draw(seat, seat.hands[seat.current])
+        self.advance()
+
+    # The active hand stands; after the last hand the dealer plays and the round
+    # settles. Returns the seat 0 outcome once settled, else None.
+    def stand(self):
+        self.require("stand", PLAYING)
+        self.active_seat.actions.append(STAND)
+        self.next_hand()
+        self.advance()
+        return self.outcome if self.state == RESULT else None
+
+    # Double the hand's bet for exactly one more card
+    def double(self):
+        self.check(DOUBLE)
+        seat = self.active_seat
+        self.balance -= seat.bets[seat.current]
+        seat.bets[seat.current] *= 2
+        seat.actions.append(DOUBLE)
+        self.draw(seat, seat.hands[seat.current])
+        self.next_hand()
+        self.advance()
+
+    # Split a pair into two hands with equal bets; the second hand gets its
+    # second card when its turn comes
+    def split(self):
+        self.check(SPLIT)
+        seat = self.active_seat
+        first, second = seat.hands[seat.current].cards
+        bet = seat.bets[seat.current]
+        self.balance -= bet
+        seat.hands[seat.current:seat.current + 1] = [Hand([first]), Hand([second])]
+        seat.bets.insert(seat.current + 1, bet)
+        seat.split_aces = CARD_VALUES[first] == 11
+        seat.actions.append(SPLIT)
+        self.draw(seat, seat.hands[seat.current])
+        self.advance()
+
+    # Give up the hand for half the bet back
+    def surrender(self):
+        self.check(SURRENDER)
+        seat = self.active_seat
+        seat.surrendered = True
+        seat.actions.append(SURRENDER)
+        self.next_hand()
+        self.advance()
+
+    def next_hand(self):
+        seat = self.active_seat
+        if seat.current + 1 < len(seat.hands):
+            seat.current += 1
+            self.draw(seat, seat.hands[seat.current])
+            return
+        later = [index for index in self.seats_in_round() if index > self.active]
+        if later:
+            self.active = later[0]
+        else:
+            self.finish_round()
+
+    # Move play past hands with nothing left to decide (busts, naturals, split
+    # aces that may not be hit); the round settles after the last one
+    def advance(self):
+        while self.state == PLAYING and not self.hand_actions(self.active_seat) & ~(1 << STAND):
+            self.next_hand()
+
+    def finish_round(self):
+        self.active = None
+        self.dealer_play()
+        self.determine_winner()
+        self.state = RESULT
+
+    def next_round(self):
+        self.require("start a new round", RESULT)
+        self.new_round()
+        if self.balance <= 0:
+            self.state = GAME_OVER
+
+    def reset_game(self, balance=STARTING_BALANCE):
+        self.balance = balance
+        self.stats = {"games": 0, "wins": 0, "losses": 0, "pushes": 0}
+        self.new_round()
+
+    def get_card_value(self, card):
+        return CARD_VALUES[card]
+
+    # Hands track their own running total as cards are appended
+    def calculate_hand(self, hand):
+        return hand.total
+
+    # The rules' dealer_hits table covers both S17 and H17 tables
+    def dealer_play(self):
+        hits = self.tables.dealer_hits
+        hand = self.dealer_hand
+        while hits[hand.total * 2 + hand.is_soft()]:
+            hand.append(self.shoe.deal())
+
+    def hand_outcome(self, seat, hand, dealer_score, dealer_natural):
+        if seat.surrendered:
+            return "surrender"
+        natural = NATURAL_OUTCOMES[(len(seat.hands) == 1 and self.is_natural(hand)) * 2 + dealer_natural]
+        return natural or hand_outcome(self.calculate_hand(hand), dealer_score)
+
+    # Settle every hand in one pass against the dealer's final total, then notify
+    # the listeners once with all the results. Returns the seat outcomes in seat order.
+    def determine_winner(self):
+        dealer_score = self.calculate_hand(self.dealer_hand)
+        dealer_natural = self.is_natural(self.dealer_hand)
+        dealer_cards = bytes(self.dealer_hand.cards)
+        returns = self.tables.returns
+        results = []
+        hands = 0
+        for index in self.seats_in_round():
+            seat = self.seats[index]
+            paid = seat.insurance * INSURANCE_RETURN if dealer_natural else 0
+            seat.outcomes = []
+            for hand, bet in zip(seat.hands, seat.bets):
+                outcome = self.hand_outcome(seat, hand, dealer_score, dealer_natural)
+                won, staked = returns[outcome]
+                paid += bet * won // staked
+                seat.outcomes.append(outcome)
+                self.stats[OUTCOME_STATS[outcome]] += 1
+            delta = paid - seat.bet - seat.insurance
+            self.balance += paid
+            # A split seat is summed up by its net result
+            if len(seat.outcomes) == 1:
+                seat.outcome = seat.outcomes[0]
+            else:
+                seat.outcome = "win" if delta > 0 else "loss" if delta < 0 else "push"
+            results.append(RoundResult(self.seed, bytes(seat.cards), dealer_cards, seat.stake, bytes(seat.actions),
+                                       seat.outcome, delta, self.balance, self.shoe.shuffles, self.shoe.round_start,
+                                       index))
+            hands += len(seat.hands)
+            seat.bets = [0] * len(seat.hands)
+        self.stats["games"] += hands
+        self.count_round(hands)
+        self.last_results = results
+        for callback in self.listeners:
+            callback(self, results)
+        return [result.outcome for result in results]
+
+    def count_round(self, hands):
+        throughput = self.throughput
+        # A reshuffle before this round means every hand so far came from finished shoes
+        if self.shoe.shuffles != self.counted_shuffles:
+            throughput["shoes"] += self.shoe.shuffles - self.counted_shuffles
+            throughput["shoe_hands"] = throughput["hands"]
+            self.counted_shuffles = self.shoe.shuffles
+        throughput["rounds"] += 1
+        throughput["hands"] += hands
+        throughput["cards"] += self.shoe.position - self.shoe.round_start
+
+    # Average hands dealt from one shoe, over the shoes finished so far
+    def hands_per_shoe(self):
+        throughput = self.throughput
+        if not throughput["shoes"]:
+            return None
+        return throughput["shoe_hands"] / throughput["shoes"]
+
+
+# Engine methods by action code, for replaying and remote play
+ENGINE_ACTIONS = {HIT: BlackjackEngine.hit, STAND: BlackjackEngine.stand, DOUBLE: BlackjackEngine.double,
+                  SPLIT: BlackjackEngine.split, SURRENDER: BlackjackEngine.surrender, INSURE: BlackjackEngine.insure,
+                  NO_INSURANCE: BlackjackEngine.decline_insurance}
@@ -0,0 +1,294 @@
+# Hand history: an append-only log of every round the game settles
+#
+# Each round is one fixed-size record (seed, cards in deal order, bet, actions,
+# outcome, balance change), so hand N lives at a known offset and the file can be
+# memory-mapped and read lazily however large it grows. A sparse side index keeps
+# the time of every INDEX_STRIDE-th hand for seeking by date. Hands are replayed
+# from their recorded cards and actions through the same engine the game uses.
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+from cards import CARD_NAMES
+from engine import INSURANCE, PLAYING, BlackjackEngine, EngineError
+from rules import ACTION_NAMES, DEFAULT_RULES, rules_code, rules_from_code
+
+HISTORY_FILE = "history.bin"
+MAGIC = b"BJHH"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHH8x")
+
+# hand, seed, time, balance after, bet, balance delta, shoe shuffles, round start in
+# the shoe, outcome, player/dealer card counts, action count, flags, cards, actions,
+# seat and the table rules (rules.rules_code; 0 in files from before rule variants)
+MAX_CARDS = 48
+MAX_ACTIONS = 24
+RECORD = struct.Struct(f"<QQdqiiIHBBBBB{MAX_CARDS}s{MAX_ACTIONS}sBI")
+
+OUTCOMES = ["win", "loss", "push", "blackjack", "surrender"]
+TRUNCATED = 1  # the round had more cards or actions than a record holds
+
+# Every INDEX_STRIDE-th hand: its number and time
+INDEX_STRIDE = 1024
+INDEX_ENTRY = struct.Struct("<Qd")
+
+HandRecord = namedtuple("HandRecord", ["hand", "seed", "time", "balance", "bet", "delta", "shuffles", "position",
+                                       "outcome", "player_cards", "dealer_cards", "actions", "truncated", "seat",
+                                       "rules"])
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + ".idx"
+
+
+def record_offset(hand):
+    return FILE_HEADER.size + hand * RECORD.size
+
+
+def decode_record(data, offset=0):
+    (hand, seed, timestamp, balance, bet, delta, shuffles, position, outcome, player_count, dealer_count,
+     action_count, flags, cards, actions, seat, rules) = RECORD.unpack_from(data, offset)
+    # Cards are stored in deal order: two to the player, two to the dealer, then
+    # the player's later cards (hits, doubles, split hands), then the dealer's draws.
+    # Cards and actions stay bytes, so an archived hand costs little in memory.
+    player_cards = cards[:2] + cards[4:player_count + 2]
+    dealer_cards = cards[2:4] + cards[player_count + 2:player_count + dealer_count]
+    return HandRecord(hand, seed, timestamp, balance, bet, delta, shuffles, position, OUTCOMES[outcome],
+                      player_cards, dealer_cards, actions[:action_count], bool(flags & TRUNCATED), seat,
+                      rules_from_code(rules))
+
+
+def encode_record(hand, seed, timestamp, balance, bet, delta, shuffles, position, outcome, player_cards,
+                  dealer_cards, actions, seat=0, rules=DEFAULT_RULES):
+    cards = bytes(player_cards[:2]) + bytes(dealer_cards[:2]) + bytes(player_cards[2:]) + bytes(dealer_cards[2:])
+    flags = TRUNCATED if len(cards) > MAX_CARDS or len(actions) > MAX_ACTIONS else 0
+    return RECORD.pack(hand, seed & 0xFFFFFFFFFFFFFFFF, timestamp, balance, bet, delta, shuffles, position,
+                       OUTCOMES.index(outcome), min(len(player_cards), MAX_CARDS), min(len(dealer_cards), MAX_CARDS),
+                       min(len(actions), MAX_ACTIONS), flags, cards[:MAX_CARDS], bytes(actions[:MAX_ACTIONS]), seat,
+                       rules_code(rules))
+
+
+def read_header(f):
+    header = f.read(FILE_HEADER.size)
+    if len(header) != FILE_HEADER.size or FILE_HEADER.unpack(header) != (MAGIC, VERSION, RECORD.size):
+        raise ValueError(f"{f.name} is not a version {VERSION} hand history")
+
+
+# Appends one record per settled round. A torn record left by a crash is cut off
+# when the file is reopened, and the index is rebuilt if it fell behind.
+class HistoryWriter:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size))
+        with open(path, "r+b") as f:
+            read_header(f)
+            self.count = (os.path.getsize(path) - FILE_HEADER.size) // RECORD.size
+            f.truncate(record_offset(self.count))
+        self.file = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        self.sync_index()
+
+    def sync_index(self):
+        entries = self.index.tell() // INDEX_ENTRY.size
+        wanted = -(-self.count // INDEX_STRIDE)
+        if entries == wanted:
+            return
+        self.index.truncate(0)
+        with open(self.path, "rb") as f:
+            for hand in range(0, self.count, INDEX_STRIDE):
+                f.seek(record_offset(hand))
+                self.index.write(INDEX_ENTRY.pack(hand, decode_record(f.read(RECORD.size)).time))
+        self.index.flush()
+
+    # Record one settled seat; `outcome` is one of OUTCOMES and `rules` the table's rules.Rules
+    def append(self, seed, player_cards, dealer_cards, bet, actions, outcome, delta, balance, shuffles=0, position=0,
+               seat=0, rules=DEFAULT_RULES):
+        hand = self.count
+        timestamp = time.time()
+        self.file.write(encode_record(hand, seed, timestamp, balance, bet, delta, shuffles, position, outcome,
+                                      player_cards, dealer_cards, actions, seat, rules))
+        self.file.flush()
+        if hand % INDEX_STRIDE == 0:
+            self.index.write(INDEX_ENTRY.pack(hand, timestamp))
+            self.index.flush()
+        self.count += 1
+        return hand
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+# Random access to a history file without reading it into memory
+class HistoryReader:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.file = open(path, "rb")
+        read_header(self.file)
+        self.count = (os.path.getsize(path) - FILE_HEADER.size) // RECORD.size
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.data = None  # no mmap support: fall back to seek and read
+        self.index_times = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, hand):
+        if hand < 0:
+            hand += self.count
+        if not 0 <= hand < self.count:
+            raise IndexError(f"hand {hand} is not in {self.path} ({self.count} hands)")
+        if self.data is not None:
+            return decode_record(self.data, record_offset(hand))
+        self.file.seek(record_offset(hand))
+        return decode_record(self.file.read(RECORD.size))
+
+    def records(self, start=0, stop=None):
+        for hand in range(start, self.count if stop is None else min(stop, self.count)):
+            yield self[hand]
+
+    # First hand played at or after `timestamp`: a binary search over the sparse
+    # index, then a scan of at most INDEX_STRIDE records
+    def find_time(self, timestamp):
+        if self.index_times is None:
+            self.index_times = []
+            try:
+                with open(index_path(self.path), "rb") as f:
+                    for _, entry_time in INDEX_ENTRY.iter_unpack(f.read()):
+                        self.index_times.append(entry_time)
+            except FileNotFoundError:
+                pass
+        block = max(0, bisect.bisect_left(self.index_times, timestamp) - 1)
+        for record in self.records(block * INDEX_STRIDE):
+            if record.time >= timestamp:
+                return record.hand
+        return self.count
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+
+# Deals a recorded round back in its original order
+class ReplayShoe:
+    def __init__(self, record):
+        self.cards = (record.player_cards[:2] + record.dealer_cards[:2] + record.player_cards[2:]
+                      + record.dealer_cards[2:])
+        self.position = 0
+        self.round_start = record.position
+        self.shuffles = record.shuffles
+
+    def start_round(self):
+        self.position = self.round_start = 0
+
+    def deal(self):
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+
+# Re-run a recorded seat on a one-seat BlackjackEngine with the recorded rules,
+# dealing from the recorded cards: the same bet, the player's actions, then the
+# engine's own dealer play and settlement. Returns the seat, the dealer's hand,
+# the outcome and the balance change.
+def replay_hand(record):
+    engine = BlackjackEngine(record.balance - record.delta, record.seed, record.rules, shoe=ReplayShoe(record))
+    engine.place_bet(record.bet)
+    engine.deal()
+    for action in record.actions:
+        if engine.state not in (INSURANCE, PLAYING):
+            break
+        engine.act(action)
+    delta = engine.last_results[0].delta if engine.last_results else 0
+    return engine.seats[0], engine.dealer_hand, engine.outcome, delta
+
+
+def replay_matches(record):
+    try:
+        seat, dealer, outcome, delta = replay_hand(record)
+    except EngineError:
+        return False
+    return (outcome == record.outcome and delta == record.delta and seat.cards == record.player_cards
+            and dealer.cards == record.dealer_cards)
+
+
+def format_record(record):
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.time))
+    lines = [f"hand {record.hand} at {when} (seed {record.seed}, shuffle {record.shuffles}, card {record.position}, "
+             f"seat {record.seat + 1})",
+             f"  player: {', '.join(CARD_NAMES[card] for card in record.player_cards)}",
+             f"  dealer: {', '.join(CARD_NAMES[card] for card in record.dealer_cards)}",
+             f"  actions: {', '.join(ACTION_NAMES.get(action, '?') for action in record.actions)}",
+             f"  bet {record.bet}: {record.outcome} {record.delta:+d}, balance {record.balance}"]
+    if record.truncated:
+        lines.append("  (truncated: more cards or actions than a record holds)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay the hand history")
+    parser.add_argument("--file", default=HISTORY_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="number of hands and the time span")
+    show = commands.add_parser("show", help="print hands starting at HAND (negative counts from the end)")
+    show.add_argument("hand", type=int)
+    show.add_argument("--count", type=int, default=1)
+    replay = commands.add_parser("replay", help="re-run one hand and compare it with the record")
+    replay.add_argument("hand", type=int)
+    verify = commands.add_parser("verify", help="replay a range of hands and report mismatches")
+    verify.add_argument("--start", type=int, default=0)
+    verify.add_argument("--count", type=int, default=None)
+    since = commands.add_parser("since", help="first hand played at or after a local time (YYYY-MM-DD [HH:MM])")
+    since.add_argument("when", nargs="+")
+    args = parser.parse_args()
+
+    reader = HistoryReader(args.file)
+    if args.command == "info":
+        print(f"{args.file}: {len(reader):,} hands, {RECORD.size} bytes each")
+        if len(reader):
+            print(format_record(reader[0]).splitlines()[0])
+            print(format_record(reader[-1]).splitlines()[0])
+    elif args.command == "show":
+        start = args.hand + len(reader) if args.hand < 0 else args.hand
+        for record in reader.records(start, start + args.count):
+            print(format_record(record))
+    elif args.command == "replay":
+        record = reader[args.hand]
+        print(format_record(record))
+        seat, dealer, outcome, delta = replay_hand(record)
+        player = " / ".join(str(hand.total) for hand in seat.hands)
+        print(f"replayed: player {player}, dealer {dealer.total}: {outcome} {delta:+d} "
+              f"({'matches' if replay_matches(record) else 'DOES NOT MATCH'} the record)")
+    elif args.command == "verify":
+        stop = None if args.count is None else args.start + args.count
+        start_time = time.perf_counter()
+        checked = mismatches = skipped = 0
+        for record in reader.records(args.start, stop):
+            if record.truncated:
+                skipped += 1
+                continue
+            checked += 1
+            if not replay_matches(record):
+                mismatches += 1
+                print(f"mismatch: hand {record.hand}")
+        elapsed = time.perf_counter() - start_time
+        print(f"replayed {checked:,} hands in {elapsed:.2f}s: {mismatches} mismatches, {skipped} truncated skipped")
+    elif args.command == "since":
+        when = " ".join(args.when)
+        pattern = "%Y-%m-%d %H:%M" if " " in when else "%Y-%m-%d"
+        hand = reader.find_time(time.mktime(time.strptime(when, pattern)))
+        print(f"hand {hand}" if hand < len(reader) else "no hands since then")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Write-behind saves
+#
+# Callers stage changes instead of writing them themselves. Rapid changes (a run
+# of chip clicks) are coalesced into one write once things go quiet, done on a
+# background thread. The game saves through profiles.ProfileStore, which batches
+# the staged changes into SQLite transactions.
+import atexit
+import platform
+import threading
+import time
+
+# The browser build cannot start threads; it calls poll() from the main loop instead
+THREADS_AVAILABLE = platform.system() != "Emscripten"
+
+SAVE_DELAY = 0.5  # seconds of quiet before a write
+SAVE_MAX_DELAY = 2.0  # longest a change can wait while changes keep coming
+
+
+# Debounced background writes. Subclasses stage changes under `lock` and call
+# schedule(), return everything staged from take_batch() and persist it in
+# write(); runs of changes are coalesced into one write once things go quiet.
+class WriteBehind:
+    def __init__(self, delay=SAVE_DELAY, max_delay=SAVE_MAX_DELAY, threaded=True):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.first_change = None
+        self.deadline = None
+        self.writes = 0
+        self.closed = False
+        self.lock = threading.Condition()
+        self.write_lock = threading.Lock()  # keeps writes in the order their changes were staged
+        self.thread = None
+        if threaded and THREADS_AVAILABLE:
+            self.thread = threading.Thread(target=self.run, name="write-behind", daemon=True)
+            self.thread.start()
+        # Last resort for exits that skip close(), e.g. an uncaught exception
+        atexit.register(self.close)
+
+    @property
+    def dirty(self):
+        return self.deadline is not None
+
+    # Call with `lock` held after staging a change
+    def schedule(self):
+        now = time.monotonic()
+        if self.first_change is None:
+            self.first_change = now
+        self.deadline = min(now + self.delay, self.first_change + self.max_delay)
+        self.lock.notify()
+
+    def take_pending(self):
+        with self.lock:
+            batch = self.take_batch()
+            self.first_change = self.deadline = None
+            return batch
+
+    # Write anything staged now, on the calling thread
+    def flush(self):
+        with self.write_lock:
+            batch = self.take_pending()
+            if batch is not None:
+                self.write(batch)
+
+    # Without a writer thread: write once the debounce deadline has passed
+    def poll(self):
+        if self.thread is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.flush()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.closed and (self.deadline is None or self.deadline > time.monotonic()):
+                    self.lock.wait(None if self.deadline is None else self.deadline - time.monotonic())
+                if self.closed:
+                    return
+            self.flush()
+
+    # Stop the writer thread and write whatever is still pending
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
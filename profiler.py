@@ -0,0 +1,142 @@
+# Low-overhead section timer for the game loop
+#
+#   with PROFILER.section("draw", state):
+#       ...
+#
+# While enabled, every section appends (name, start, duration, thread) to a
+# fixed-size ring buffer of preallocated arrays, so recording never allocates
+# beyond the section object and old events are simply overwritten. Sections
+# timed with frame() also feed a ring of frame times for FPS and percentiles.
+# While disabled, section() hands back one shared no-op context manager, so
+# instrumented code pays only a method call.
+#
+# Sections may end on any thread (the save writer records its own); events are
+# tagged with the thread so the trace shows them on separate tracks.
+#
+# dump_trace() writes the buffer in the Chrome trace event format, which
+# chrome://tracing and https://ui.perfetto.dev open directly.
+import json
+import threading
+import time
+from array import array
+
+EVENT_CAPACITY = 1 << 15
+FRAME_CAPACITY = 1024
+FRAME = "frame"
+
+
+class NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SECTION = NullSection()
+
+
+class Section:
+    __slots__ = ("profiler", "section", "start")
+
+    def __init__(self, profiler, section):
+        self.profiler = profiler
+        self.section = section
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.section, self.start, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self, capacity=EVENT_CAPACITY, frame_capacity=FRAME_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self.names = [FRAME]  # section id -> "name" or "name.detail"
+        self.ids = {(FRAME, None): 0}
+        self.sections = array("H", bytes(2 * capacity))
+        self.starts = array("q", bytes(8 * capacity))
+        self.durations = array("q", bytes(8 * capacity))
+        self.threads = array("Q", bytes(8 * capacity))
+        self.count = 0  # events ever recorded; the newest is at (count - 1) % capacity
+        self.frame_capacity = frame_capacity
+        self.frame_times = array("q", bytes(8 * frame_capacity))
+        self.frame_ends = array("q", bytes(8 * frame_capacity))
+        self.frames = 0
+        self.origin = time.perf_counter_ns()
+
+    def section(self, name, detail=None):
+        if not self.enabled:
+            return NULL_SECTION
+        key = (name, detail)
+        section = self.ids.get(key)
+        if section is None:
+            section = self.ids[key] = len(self.names)
+            self.names.append(name if detail is None else f"{name}.{detail}")
+        return Section(self, section)
+
+    def frame(self):
+        return Section(self, 0) if self.enabled else NULL_SECTION
+
+    def record(self, section, start, duration):
+        index = self.count % self.capacity
+        self.sections[index] = section
+        self.starts[index] = start
+        self.durations[index] = duration
+        self.threads[index] = threading.get_ident()
+        self.count += 1
+        if section == 0:
+            index = self.frames % self.frame_capacity
+            self.frame_times[index] = duration
+            self.frame_ends[index] = start + duration
+            self.frames += 1
+
+    # Frames per second over the last `window` seconds, frame-time percentiles in
+    # ms over the buffered frames, and the sections taking the most time per frame
+    # over those same frames
+    def summary(self, window=1.0, top=5):
+        frames = min(self.frames, self.frame_capacity)
+        if not frames:
+            return None
+        times = sorted(self.frame_times[:frames])
+        now = time.perf_counter_ns()
+        recent = sum(1 for end in self.frame_ends[:frames] if now - end <= window * 1e9)
+        oldest = self.frames % self.frame_capacity if self.frames > self.frame_capacity else 0
+        since = self.frame_ends[oldest] - self.frame_times[oldest]
+
+        # Events are stored as they end, so walk back from the newest
+        totals = {}
+        for count in range(self.count - 1, max(-1, self.count - 1 - self.capacity), -1):
+            i = count % self.capacity
+            if self.starts[i] < since:
+                break
+            section = self.sections[i]
+            if section:
+                totals[section] = totals.get(section, 0) + self.durations[i]
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {"fps": recent / window,
+                "p50": times[len(times) // 2] / 1e6,
+                "p99": times[min(len(times) - 1, len(times) * 99 // 100)] / 1e6,
+                "sections": [(self.names[section], total / frames / 1e6) for section, total in ranked]}
+
+    def trace_events(self):
+        events = []
+        for count in range(max(0, self.count - self.capacity), self.count):
+            i = count % self.capacity
+            events.append({"name": self.names[self.sections[i]], "ph": "X", "pid": 0, "tid": self.threads[i],
+                           "ts": (self.starts[i] - self.origin) / 1000, "dur": self.durations[i] / 1000})
+        return events
+
+    # Write the buffer as a Chrome trace; returns the number of events written
+    def dump_trace(self, path):
+        events = self.trace_events()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,237 @@
+# Player profiles in one SQLite database: balance, wallpapers and purchases
+#
+#   python profiles.py [--db profiles.db] list
+#   python profiles.py show NAME [--purchases 10]
+#   python profiles.py import NAME [--json game_state.json]
+#
+# Each profile is a row keyed by a unique name, its owned wallpapers are rows
+# clustered by profile, and purchases from Buy Currency are indexed by profile
+# and time, so every lookup touches one profile's rows, however many there are.
+#
+# Saves are write-behind (persistence.WriteBehind): save() and record_purchase()
+# only stage the change, repeated saves of a profile collapse into one, and the
+# writer thread commits everything staged in a single transaction. Many tables
+# settling rounds at once cost one commit per batch instead of a file rewrite
+# per round. The database runs in WAL mode, so readers (the tools here, another
+# process) never wait for that commit, and each thread has its own connection.
+#
+# The single-player game_state.json from before profiles is imported into the
+# first profile created in a new database.
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+from persistence import SAVE_DELAY, SAVE_MAX_DELAY, WriteBehind
+from profiler import PROFILER
+
+PROFILE_DB = "profiles.db"
+LEGACY_SAVE_FILE = "game_state.json"
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT = 5.0  # seconds to wait for another process's write
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    balance INTEGER NOT NULL,
+    current_wallpaper TEXT NOT NULL DEFAULT 'default',
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS owned_wallpapers (
+    profile INTEGER NOT NULL REFERENCES profiles (id),
+    wallpaper TEXT NOT NULL,
+    PRIMARY KEY (profile, wallpaper)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY,
+    profile INTEGER NOT NULL REFERENCES profiles (id),
+    amount INTEGER NOT NULL,
+    card_last4 TEXT NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS purchases_by_profile ON purchases (profile, time);
+"""
+
+# Insert a profile or update it; a save without a wallpaper keeps the current one
+UPSERT_PROFILE = """
+INSERT INTO profiles (name, balance, current_wallpaper, updated) VALUES (?, ?, COALESCE(?, 'default'), ?)
+ON CONFLICT (name) DO UPDATE SET balance = excluded.balance,
+    current_wallpaper = COALESCE(?, current_wallpaper), updated = excluded.updated
+"""
+ADD_WALLPAPER = "INSERT OR IGNORE INTO owned_wallpapers SELECT id, ? FROM profiles WHERE name = ?"
+ADD_PURCHASE = "INSERT INTO purchases (profile, amount, card_last4, time) SELECT id, ?, ?, ? FROM profiles WHERE name = ?"
+
+
+class ProfileStore(WriteBehind):
+    def __init__(self, path=PROFILE_DB, delay=SAVE_DELAY, max_delay=SAVE_MAX_DELAY, threaded=True):
+        self.path = path
+        self.local = threading.local()
+        self.connections = []
+        self.staged = {}  # profile name -> the fields saved since the last commit
+        self.inflight = {}  # the staged fields being committed right now, still visible to load()
+        self.purchases_staged = []
+        self.transactions = 0
+        db = self.connection()
+        with db:
+            if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                db.executescript(SCHEMA)
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        super().__init__(delay, max_delay, threaded)
+
+    # This thread's connection, opened on first use
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            # Not every filesystem (e.g. the browser build's) supports WAL; SQLite then keeps its default journal
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute("PRAGMA foreign_keys = ON")
+            self.local.db = db
+            self.connections.append(db)
+        return db
+
+    # Stage `state` ({"balance", and optionally "current_wallpaper" and
+    # "owned_wallpapers"}) for the profile, creating it on commit if it is new
+    def save(self, name, state):
+        fields = {"balance": int(state["balance"])}
+        if "current_wallpaper" in state:
+            fields["current_wallpaper"] = state["current_wallpaper"]
+        if "owned_wallpapers" in state:
+            fields["owned_wallpapers"] = list(state["owned_wallpapers"])
+        with self.lock:
+            self.staged.setdefault(name, {}).update(fields)
+            self.schedule()
+
+    # Only the last four digits of the card are kept
+    def record_purchase(self, name, amount, card_number):
+        with self.lock:
+            self.purchases_staged.append((int(amount), card_number[-4:], time.time(), name))
+            self.schedule()
+
+    def take_batch(self):
+        if not self.staged and not self.purchases_staged:
+            return None
+        batch = self.staged, self.purchases_staged
+        self.inflight = self.staged
+        self.staged, self.purchases_staged = {}, []
+        return batch
+
+    def write(self, batch):
+        profiles, purchases = batch
+        now = time.time()
+        db = self.connection()
+        try:
+            with PROFILER.section("save"):
+                db.execute("BEGIN IMMEDIATE")
+                db.executemany(UPSERT_PROFILE, [(name, fields["balance"], fields.get("current_wallpaper"), now,
+                                                 fields.get("current_wallpaper"))
+                                                for name, fields in profiles.items()])
+                db.executemany(ADD_WALLPAPER, [(wallpaper, name) for name, fields in profiles.items()
+                                               for wallpaper in fields.get("owned_wallpapers", ())])
+                db.executemany(ADD_PURCHASE, purchases)
+                db.execute("COMMIT")
+            self.writes += len(profiles) + len(purchases)
+            self.transactions += 1
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            print(f"Could not save profiles to {self.path}: {e}")
+        finally:
+            with self.lock:
+                self.inflight = {}
+
+    # The profile's state as the game keeps it, including changes not yet
+    # committed, or None if there is no such profile. The uncommitted changes
+    # are read before the database, so a batch committing in between is seen
+    # either in its row or still in flight, never in neither.
+    def load(self, name):
+        with self.lock:
+            pending = [dict(fields[name]) for fields in (self.inflight, self.staged) if name in fields]
+        db = self.connection()
+        row = db.execute("SELECT id, balance, current_wallpaper FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row is None and not pending:
+            return None
+        state = {"balance": 0, "owned_wallpapers": [], "current_wallpaper": "default"}
+        if row is not None:
+            state["balance"], state["current_wallpaper"] = row[1], row[2]
+            state["owned_wallpapers"] = [wallpaper for wallpaper, in db.execute(
+                "SELECT wallpaper FROM owned_wallpapers WHERE profile = ?", (row[0],))]
+        for fields in pending:
+            owned = fields.pop("owned_wallpapers", [])
+            state.update(fields)
+            state["owned_wallpapers"] += [wallpaper for wallpaper in owned
+                                          if wallpaper not in state["owned_wallpapers"]]
+        return state
+
+    def names(self):
+        return [name for name, in self.connection().execute("SELECT name FROM profiles ORDER BY name")]
+
+    # Newest committed purchases first, as (time, amount, last four card digits)
+    def purchases(self, name, limit=20):
+        return self.connection().execute(
+            "SELECT time, amount, card_last4 FROM purchases WHERE profile = (SELECT id FROM profiles WHERE name = ?) "
+            "ORDER BY time DESC LIMIT ?", (name, limit)).fetchall()
+
+    # Import a single-player JSON save as profile `name`, committed at once.
+    # Only a database with no profiles yet takes it, so the one saved balance
+    # cannot be copied into several profiles. Returns the state, or None.
+    def import_json(self, name, path=LEGACY_SAVE_FILE):
+        if self.names():
+            return None
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        state = {"balance": saved.get("balance", 0), "owned_wallpapers": saved.get("owned_wallpapers", ["default"]),
+                 "current_wallpaper": saved.get("current_wallpaper", "default")}
+        self.save(name, state)
+        self.flush()
+        return state
+
+    def close(self):
+        super().close()
+        for db in self.connections:
+            db.close()
+        self.connections = []
+        self.local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and import player profiles")
+    parser.add_argument("--db", default=PROFILE_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="every profile with its balance")
+    show = commands.add_parser("show", help="one profile's balance, wallpapers and recent purchases")
+    show.add_argument("name")
+    show.add_argument("--purchases", type=int, default=10)
+    migrate = commands.add_parser("import", help="import a game_state.json save into a new database")
+    migrate.add_argument("name")
+    migrate.add_argument("--json", default=LEGACY_SAVE_FILE)
+    args = parser.parse_args()
+
+    store = ProfileStore(args.db, threaded=False)
+    if args.command == "list":
+        for name in store.names():
+            print(f"{name:<24} ${store.load(name)['balance']}")
+    elif args.command == "show":
+        state = store.load(args.name)
+        if state is None:
+            parser.error(f"no profile {args.name!r}")
+        print(f"{args.name}: ${state['balance']}, wallpaper {state['current_wallpaper']}, "
+              f"owns {', '.join(state['owned_wallpapers'])}")
+        for when, amount, last4 in store.purchases(args.name, args.purchases):
+            print(f"  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))}  ${amount} on card ending {last4}")
+    elif args.command == "import":
+        state = store.import_json(args.name, args.json)
+        if state is None:
+            parser.error(f"{args.db} already has profiles, or {args.json} is not a readable save")
+        print(f"Imported {args.json} as {args.name}: ${state['balance']}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Input recording for deterministic replays
+#
+#   python BlackJack.py --record session.json
+#
+# A session file is JSON holding the engine seed, the saved state the game
+# started from and, for every main-loop frame that handled input, the seconds
+# since the recording started and the events in that frame:
+#
+#   {"version": 1, "seed": 42, "state": {"balance": 1000, ...},
+#    "frames": [[0.52, [[1025, {"pos": [100, 75], "button": 1}]]], ...]}
+#
+# Events are stored as their pygame type number and attributes. Replaying the
+# frames through update_loop on a game started with BlackJack.new_game(state,
+# seed) repeats the session exactly; benchmarks/replay.py does that headlessly.
+import json
+import time
+
+import pygame
+
+SESSION_VERSION = 1
+PLAIN_TYPES = (bool, int, float, str, tuple, type(None))
+
+
+# Only plain attributes are kept (positions, keys, text); anything else, such
+# as a window object, cannot be stored and does not affect the game
+def encode_event(event):
+    return [event.type, {name: list(value) if isinstance(value, tuple) else value
+                         for name, value in event.dict.items() if isinstance(value, PLAIN_TYPES)}]
+
+
+def decode_event(item):
+    event_type, attributes = item
+    return pygame.event.Event(event_type, {name: tuple(value) if isinstance(value, list) else value
+                                           for name, value in attributes.items()})
+
+
+class Recorder:
+    def __init__(self, path, seed, state):
+        self.path = path
+        self.seed = seed
+        self.state = json.loads(json.dumps(state))  # a copy, so later changes are not recorded
+        self.frames = []
+        self.start = time.perf_counter()
+
+    # Frames without events change nothing, so only frames with input are kept
+    def record(self, events):
+        if events:
+            self.frames.append([round(time.perf_counter() - self.start, 4), [encode_event(event) for event in events]])
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump({"version": SESSION_VERSION, "seed": self.seed, "state": self.state, "frames": self.frames}, f)
+        print(f"Recorded {len(self.frames)} frames to {self.path}")
+
+
+# Returns (seed, state, frames), each frame a list of pygame events
+def load_session(path):
+    with open(path) as f:
+        session = json.load(f)
+    if session.get("version") != SESSION_VERSION:
+        raise ValueError(f"{path}: unsupported session version {session.get('version')}")
+    frames = [[decode_event(item) for item in events] for _, events in session["frames"]]
+    return session["seed"], session["state"], frames
@@ -0,0 +1,153 @@
+# Blackjack table rules shared by the pygame game and the headless simulator
+#
+# The fixed rules are module constants. Everything a casino varies (dealer soft
+# 17, decks, the blackjack payout, doubling after splits, resplits, surrender,
+# insurance) is a Rules value that the engine, the simulators and the strategy
+# table all take. rule_tables() compiles a Rules into lookup tables, so the
+# per-hand checks are index lookups however many variants there are.
+from collections import namedtuple
+from functools import lru_cache
+
+BLACKJACK = 21
+DEALER_STAND_TOTAL = 17  # dealer hits below 17
+
+# Shoe: number of decks and the fraction dealt before the cut card forces a reshuffle
+DEFAULT_DECKS = 6
+DEFAULT_PENETRATION = 0.75
+
+# Amount returned per unit bet (the bet is taken from the balance when placed)
+WIN_PAYOUT = 2
+PUSH_PAYOUT = 1
+LOSS_PAYOUT = 0
+
+OUTCOME_STATS = {"win": "wins", "loss": "losses", "push": "pushes", "blackjack": "wins", "surrender": "losses"}
+OUTCOME_PAYOUTS = {"win": WIN_PAYOUT, "loss": LOSS_PAYOUT, "push": PUSH_PAYOUT}
+
+# Player action codes, as stored in the hand history
+HIT, STAND, DOUBLE, SPLIT, SURRENDER, INSURE, NO_INSURANCE = 1, 2, 3, 4, 5, 6, 7
+ACTION_NAMES = {HIT: "hit", STAND: "stand", DOUBLE: "double", SPLIT: "split", SURRENDER: "surrender",
+                INSURE: "insure", NO_INSURANCE: "decline"}
+
+# Blackjack payouts a table can offer, as (won, staked); None means a natural is
+# just another 21 paying even money and the dealer never peeks, as the game
+# played before rule variants existed
+BLACKJACK_PAYOUTS = [None, (3, 2), (6, 5), (1, 1), (2, 1)]
+
+Rules = namedtuple("Rules", ["decks", "penetration", "dealer_hits_soft_17", "blackjack_payout", "double_after_split",
+                             "max_split_hands", "resplit_aces", "hit_split_aces", "surrender", "insurance"],
+                   defaults=[DEFAULT_DECKS, DEFAULT_PENETRATION, False, (3, 2), True, 4, False, False, True, True])
+DEFAULT_RULES = Rules()
+# The game before rule variants existed; hand-history records without rules replay under these
+LEGACY_RULES = Rules(blackjack_payout=None, double_after_split=False, max_split_hands=1, surrender=False,
+                     insurance=False)
+
+
+# Build a Rules value from user input, rejecting combinations the tables cannot express
+def make_rules(**options):
+    if isinstance(options.get("blackjack_payout"), list):
+        options["blackjack_payout"] = tuple(options["blackjack_payout"])
+    rules = Rules(**options)
+    if rules.blackjack_payout not in BLACKJACK_PAYOUTS:
+        raise ValueError(f"blackjack must pay one of {BLACKJACK_PAYOUTS[1:]}, not {rules.blackjack_payout}")
+    if not 1 <= rules.decks <= 255:
+        raise ValueError(f"a shoe has 1 to 255 decks, not {rules.decks}")
+    if not 1 <= rules.max_split_hands <= 8:
+        raise ValueError(f"splitting allows 1 to 8 hands, not {rules.max_split_hands}")
+    if not 0 <= rules.penetration <= 1:
+        raise ValueError(f"penetration is a fraction of the shoe, not {rules.penetration}")
+    return rules
+
+
+# Rules packed into 32 bits for the hand history; 0 is LEGACY_RULES, so records
+# written before the field existed replay under the rules they were played with.
+# The penetration is not kept; it never changes how a recorded hand plays.
+RULE_FLAGS = ["dealer_hits_soft_17", "double_after_split", "resplit_aces", "hit_split_aces", "surrender", "insurance"]
+
+
+def rules_code(rules):
+    code = BLACKJACK_PAYOUTS.index(rules.blackjack_payout) | (rules.max_split_hands - 1) << 3 | rules.decks << 24
+    for bit, name in enumerate(RULE_FLAGS):
+        code |= bool(getattr(rules, name)) << (6 + bit)
+    return code
+
+
+def rules_from_code(code):
+    flags = {name: bool(code >> (6 + bit) & 1) for bit, name in enumerate(RULE_FLAGS)}
+    return Rules(decks=code >> 24 or DEFAULT_DECKS, blackjack_payout=BLACKJACK_PAYOUTS[code & 7],
+                 max_split_hands=(code >> 3 & 7) + 1, **flags)
+
+
+# Situation bits describing a player hand; rule_tables().actions is indexed by their sum
+FIRST_DECISION = 1  # exactly two cards
+PAIR = 2  # two cards of the same value
+SPLIT_HAND = 4  # one of several hands split from a seat
+SPLIT_ACES = 8  # the seat split aces
+HANDS_FULL = 16  # the seat already has max_split_hands hands
+FINISHED = 32  # busted, or a natural that needs no decision
+SITUATIONS = 64
+
+# What each outcome returns per unit staked, as (numerator, denominator)
+RETURNS = {"win": (WIN_PAYOUT, 1), "loss": (LOSS_PAYOUT, 1), "push": (PUSH_PAYOUT, 1), "surrender": (1, 2)}
+INSURANCE_RETURN = 3  # insurance pays 2 to 1
+# Natural outcomes indexed by player natural * 2 + dealer natural
+NATURAL_OUTCOMES = [None, "loss", "blackjack", "push"]
+
+RuleTables = namedtuple("RuleTables", ["dealer_hits", "actions", "returns"])
+
+
+def allowed_actions(rules, situation):
+    if situation & FINISHED:
+        return 0
+    first = situation & FIRST_DECISION
+    split_aces = situation & SPLIT_ACES
+    split_hand = situation & SPLIT_HAND
+    allowed = 1 << STAND
+    if not split_aces or rules.hit_split_aces:
+        allowed |= 1 << HIT
+        if first and (not split_hand or rules.double_after_split):
+            allowed |= 1 << DOUBLE
+    if first and situation & PAIR and not situation & HANDS_FULL and (not split_aces or rules.resplit_aces):
+        allowed |= 1 << SPLIT
+    if first and not split_hand and rules.surrender and rules.blackjack_payout is not None:
+        allowed |= 1 << SURRENDER
+    return allowed
+
+
+# dealer_hits is indexed by total * 2 + soft, actions by situation (a bit mask of
+# action codes), and returns maps an outcome to (numerator, denominator)
+@lru_cache(maxsize=None)
+def rule_tables(rules):
+    dealer_hits = bytes(total < DEALER_STAND_TOTAL or (total == DEALER_STAND_TOTAL and soft
+                                                       and rules.dealer_hits_soft_17)
+                        for total in range(BLACKJACK + 11) for soft in (0, 1))
+    actions = bytes(allowed_actions(rules, situation) for situation in range(SITUATIONS))
+    returns = dict(RETURNS)
+    if rules.blackjack_payout is not None:
+        won, staked = rules.blackjack_payout
+        returns["blackjack"] = (won + staked, staked)
+    return RuleTables(dealer_hits, actions, returns)
+
+
+def add_rules_arguments(parser):
+    parser.add_argument("--decks", type=int, default=DEFAULT_DECKS)
+    parser.add_argument("--penetration", type=float, default=DEFAULT_PENETRATION,
+                        help="fraction of the shoe dealt before the cut card (0 reshuffles every hand)")
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17")
+    parser.add_argument("--blackjack-pays", default="3:2", help="3:2, 6:5, 1:1, 2:1, or none for even money")
+
+
+def rules_from_args(args):
+    payout = None if args.blackjack_pays == "none" else tuple(int(part) for part in args.blackjack_pays.split(":"))
+    return make_rules(decks=args.decks, penetration=args.penetration, dealer_hits_soft_17=args.h17,
+                      blackjack_payout=payout)
+
+
+# Same comparison the game has always used: a player bust loses even if the dealer busts too
+def hand_outcome(player_score, dealer_score):
+    if player_score > BLACKJACK:
+        return "loss"
+    if dealer_score > BLACKJACK or player_score > dealer_score:
+        return "win"
+    if dealer_score > player_score:
+        return "loss"
+    return "push"
@@ -0,0 +1,287 @@
+# Multi-table Blackjack server: many independent BlackjackEngine tables in one asyncio process
+#
+#   python server.py [--host 127.0.0.1] [--port 8765] [--max-tables 10000] [--profiles profiles.db]
+#
+# Protocol: newline-delimited JSON over TCP. Every request is an object with an
+# "op" and an optional "id" that is echoed back, so a client can pipeline
+# requests for many tables on one connection:
+#
+#   {"id": 1, "op": "open", "balance": 1000, "seed": 7}  -> {"id": 1, "ok": true, "table": 3, ...}
+#   {"id": 2, "op": "bet", "table": 3, "amount": 50}     -> first bet of a round also deals
+#   {"id": 3, "op": "hit", "table": 3}
+#   {"id": 4, "op": "stand", "table": 3}                 -> dealer plays, round settles
+#   {"id": 5, "op": "next", "table": 3}                  -> back to betting (or game_over)
+#
+# "double", "split" and "surrender" are played like "hit"; when the dealer shows
+# an ace the table waits in "insurance" for "insure" or "decline". "allowed" in
+# the view lists what the active hand may do. "open" takes "rules" with any
+# rules.Rules fields, e.g. {"dealer_hits_soft_17": true, "blackjack_payout": [6, 5]}.
+# Other ops: "state", "reset" (start over with a fresh "balance") and "close".
+# A table opened with "seats": N (up to 7) takes bets with a "seat" index and is
+# dealt with an explicit {"op": "deal"}; hit and stand act on the active seat.
+# With --profiles, "open" can take a "profile" name instead of a balance: the
+# table plays that profile's balance (a new profile starts with STARTING_BALANCE),
+# one table per profile, and the balance is saved to the profile store after
+# every settled round, on "reset" and when the table closes. Clients cannot set a
+# profile's balance: "reset" on a profile table only restarts a broke player (no
+# chips left and none on the table, also when a profile reopens at 0) with
+# STARTING_BALANCE and ignores "balance". Profile tables also play the server's
+# rules from a seed the server draws, so "open" with a "profile" rejects "seed"
+# and "rules": a better payout or a known shoe would farm the stored balance.
+# Saves are batched by the store, so any number of tables cost one SQLite commit
+# per batch.
+# Replies carry "ok" and the table view, or "ok": false and an "error". Tables
+# belong to the connection that opened them and are closed when it disconnects.
+import argparse
+import asyncio
+import itertools
+import json
+import secrets
+from functools import partial
+
+from engine import BETTING, INSURANCE, PLAYING, STARTING_BALANCE, BlackjackEngine, EngineError
+from profiles import ProfileStore
+from rules import ACTION_NAMES, DEFAULT_RULES, make_rules
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_TABLES = 10000
+MAX_LINE = 64 * 1024
+ACTION_OPS = {name: action for action, name in ACTION_NAMES.items()}
+
+
+# A client-chosen balance must be a whole number of chips above zero
+def request_balance(request):
+    balance = request.get("balance", STARTING_BALANCE)
+    if isinstance(balance, bool) or not isinstance(balance, int) or balance <= 0:
+        raise EngineError(f"invalid balance {balance!r}")
+    return balance
+
+
+# What a client at the table may see: the dealer's hole card stays hidden while playing
+def table_view(table_id, engine):
+    dealer = list(engine.dealer_hand.cards)
+    hidden = engine.state in (INSURANCE, PLAYING)
+    if hidden:
+        dealer = dealer[:1]
+    allowed = engine.allowed_actions()
+    return {"table": table_id, "state": engine.state, "balance": engine.balance, "bet": engine.bet,
+            "player": list(engine.player_hand.cards), "player_total": engine.player_hand.total,
+            "dealer": dealer, "dealer_total": None if hidden else engine.dealer_hand.total,
+            "outcome": engine.outcome, "active": engine.active,
+            "allowed": [name for action, name in ACTION_NAMES.items() if allowed & 1 << action],
+            "seats": [{"bet": seat.bet, "current": seat.current, "outcome": seat.outcome, "outcomes": seat.outcomes,
+                       "hands": [{"cards": list(hand.cards), "total": hand.total} for hand in seat.hands]}
+                      for seat in engine.seats]}
+
+
+class TableServer:
+    def __init__(self, max_tables=MAX_TABLES, profiles=None, rules=DEFAULT_RULES):
+        self.max_tables = max_tables
+        self.profiles = profiles  # a profiles.ProfileStore, for tables opened with "profile"
+        self.rules = rules  # what profile tables play
+        self.tables = {}
+        self.seated = {}  # table id -> profile name
+        self.seated_profiles = set()
+        self.ids = itertools.count(1)
+        self.requests = 0
+
+    def open_table(self, request, owned):
+        if len(self.tables) >= self.max_tables:
+            raise EngineError("server is full")
+        profile = request.get("profile")
+        if profile is None:
+            balance = request_balance(request)
+            seed, rules = request.get("seed"), make_rules(**request.get("rules", {}))
+        else:
+            profile = str(profile)
+            if self.profiles is None:
+                raise EngineError("this server keeps no profiles")
+            if "seed" in request or "rules" in request:
+                raise EngineError("a profile table plays the server's rules and seed")
+            seed, rules = secrets.randbits(63), self.rules
+            if profile in self.seated_profiles:
+                raise EngineError(f"profile {profile} is already at a table")
+            state = self.profiles.load(profile)
+            if state is None:
+                balance = STARTING_BALANCE
+                self.profiles.save(profile, {"balance": balance})
+            else:
+                balance = state["balance"]
+        engine = BlackjackEngine(balance, seed, rules, seats=int(request.get("seats", 1)))
+        table_id = next(self.ids)
+        self.tables[table_id] = engine
+        owned.add(table_id)
+        if profile is not None:
+            engine.add_listener(partial(self.save_balance, profile))
+            self.seated[table_id] = profile
+            self.seated_profiles.add(profile)
+        return table_id
+
+    # Engine listener for profile tables; the store commits it with the next batch
+    def save_balance(self, profile, engine, results=None):
+        self.profiles.save(profile, {"balance": engine.balance})
+
+    # A bet still on the table is forfeited, as when a round is cleared
+    def close_table(self, table_id):
+        engine = self.tables.pop(table_id)
+        profile = self.seated.pop(table_id, None)
+        if profile is not None:
+            self.seated_profiles.discard(profile)
+            self.save_balance(profile, engine)
+
+    def table(self, request, owned):
+        table_id = request.get("table")
+        if table_id not in owned:
+            raise EngineError(f"no table {table_id} on this connection")
+        return table_id, self.tables[table_id]
+
+    # Apply one request and return the reply object
+    def handle(self, request, owned):
+        op = request.get("op")
+        if op == "open":
+            table_id = self.open_table(request, owned)
+            return table_view(table_id, self.tables[table_id])
+        table_id, engine = self.table(request, owned)
+        if op == "bet":
+            # Same as a chip click: the first bet of a one-seat round deals
+            if not engine.place_bet(int(request.get("amount", 0)), int(request.get("seat", 0))):
+                raise EngineError("insufficient balance")
+            if engine.state == BETTING and len(engine.seats) == 1:
+                engine.deal()
+        elif op == "deal":
+            engine.deal()
+        elif op in ACTION_OPS:
+            if engine.act(ACTION_OPS[op]) is False:
+                raise EngineError("insufficient balance")
+        elif op == "next":
+            engine.next_round()
+        elif op == "reset":
+            if table_id in self.seated:
+                if engine.balance > 0 or engine.bet:
+                    raise EngineError("a profile table can only be reset once its balance is spent")
+                engine.reset_game()
+                self.save_balance(self.seated[table_id], engine)
+            else:
+                engine.reset_game(request_balance(request))
+        elif op == "close":
+            owned.discard(table_id)
+            self.close_table(table_id)
+            return {"table": table_id, "closed": True}
+        elif op != "state":
+            raise EngineError(f"unknown op {op!r}")
+        return table_view(table_id, engine)
+
+    def reply(self, line, owned):
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            reply = self.handle(request, owned)
+            reply["ok"] = True
+        except (EngineError, ValueError, TypeError, AttributeError, OverflowError, RecursionError) as e:
+            reply = {"ok": False, "error": str(e)}
+        reply["id"] = request_id
+        return json.dumps(reply).encode() + b"\n"
+
+    # Requests are read in chunks and every complete line in a chunk is answered
+    # with a single write, so a busy pipelined connection costs one syscall per
+    # batch instead of one per request
+    async def serve_client(self, reader, writer):
+        owned = set()
+        pending = b""
+        try:
+            while True:
+                chunk = await reader.read(MAX_LINE)
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b"\n")
+                if len(pending) > MAX_LINE:
+                    break
+                if lines:
+                    writer.write(b"".join(self.reply(line, owned) for line in lines if line.strip()))
+                # Only wait for the socket when the client is not keeping up
+                if writer.transport.get_write_buffer_size() > MAX_LINE:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for table_id in owned:
+                self.close_table(table_id)
+            writer.close()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+
+
+# Thin asyncio client: one connection, any number of tables, requests pipelined by id
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.waiting = {}
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def receive(self):
+        pending = b""
+        while True:
+            chunk = await self.reader.read(MAX_LINE)
+            if not chunk:
+                break
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                reply = json.loads(line)
+                future = self.waiting.pop(reply.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        self.writer.write(json.dumps({"id": request_id, "op": op, **fields}).encode() + b"\n")
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        await self.receiver
+
+
+async def run_server(host, port, max_tables, profile_db=None):
+    profiles = ProfileStore(profile_db) if profile_db else None
+    table_server = TableServer(max_tables, profiles)
+    server = await table_server.start(host, port)
+    print(f"serving Blackjack tables on {host}:{port} (up to {max_tables})"
+          + (f", profiles in {profile_db}" if profile_db else ""))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if profiles is not None:
+            profiles.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many Blackjack tables over newline-delimited JSON")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-tables", type=int, default=MAX_TABLES)
+    parser.add_argument("--profiles", metavar="DB", help="SQLite profile store for tables opened with a profile")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_server(args.host, args.port, args.max_tables, args.profiles))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
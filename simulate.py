@@ -0,0 +1,367 @@
+# Headless Monte Carlo simulator for the Blackjack rules in rules.py
+#
+# Plays whole batches of hands at once on NumPy arrays instead of one hand at a
+# time on card-name strings, and never imports pygame. The player only hits or
+# stands, so of the rules.Rules variants the shoe, the dealer's soft 17 and the
+# blackjack payout (with the dealer peeking for naturals) apply.
+#
+# With a bet spread every shoe keeps a Hi-Lo running count as it deals, and each
+# hand's stake is read off the ramp at that shoe's true count before the deal,
+# so counting strategies can be backtested over millions of shoes.
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cards import CARD_COUNT, CARD_VALUES, HI_LO
+from rules import (BLACKJACK, DEALER_STAND_TOTAL, DEFAULT_RULES, LOSS_PAYOUT, PUSH_PAYOUT, WIN_PAYOUT,
+                   add_rules_arguments, rules_from_args)
+
+# Shoes hold the same integer cards as the game; hard values (ace = 1) come from the cards.py table
+HARD_VALUES = np.array([1 if value == 11 else value for value in CARD_VALUES], dtype=np.int16)
+HI_LO_TAGS = np.array(HI_LO, dtype=np.int32)
+DECK = np.arange(CARD_COUNT, dtype=np.int8)
+
+# Hands per chunk. Chunks are the unit of work handed to the process pool, so this stays
+# small enough that a million-hand run still splits across all cores; 500 shoes of
+# ROUNDS_PER_SHOE_ROW rounds each fill one chunk
+DEFAULT_BATCH = 100000
+# Shoes played side by side per batch, each for at least ROUNDS_PER_SHOE_ROW rounds so
+# that most of them run through several cut cards
+SHOE_TABLES = 10000
+ROUNDS_PER_SHOE_ROW = 200
+
+
+def empty_stats():
+    return {"games": 0, "wins": 0, "losses": 0, "pushes": 0, "blackjacks": 0, "wagered": 0, "net": 0,
+            "shuffles": 0}
+
+
+# "1,2,4,8" -> bet 1 unit at a true count of 1 or less, 2 at 2, 4 at 3 and 8 from 4 up
+def parse_spread(text):
+    ramp = tuple(int(units) for units in text.split(","))
+    if not ramp or min(ramp) < 1:
+        raise ValueError("a bet spread needs at least one stake of 1 unit or more")
+    return ramp
+
+
+def ramp_bets(spread, true_counts):
+    steps = np.clip(np.floor(true_counts).astype(np.intp) - 1, 0, len(spread) - 1)
+    return np.array(spread, dtype=np.int64)[steps]
+
+
+# Hands are kept as a hard total (aces count 1) plus a has-ace flag; one ace
+# counts as 11 whenever that does not bust the hand, like Blackjack.calculate_hand
+def score(hard, has_ace):
+    return hard + 10 * (has_ace & (hard <= BLACKJACK - 10))
+
+
+# Many shoes side by side: one preallocated row of cards and one position per
+# shoe. Shuffling is lazy (each deal is one Fisher-Yates step), so reshuffling a
+# shoe only resets its position. With `counting` each shoe also keeps its Hi-Lo
+# running count, which a reshuffle must reset along with the position.
+class ShoeArray:
+    def __init__(self, tables, decks, counting=False):
+        self.size = decks * CARD_COUNT
+        self.cards = np.tile(DECK, tables * decks)
+        self.positions = np.zeros(tables, dtype=np.intp)
+        self.bases = np.arange(tables, dtype=np.intp) * self.size
+        self.running_counts = np.zeros(tables, dtype=np.int32) if counting else None
+
+    # Running count per deck left in each of `rows`
+    def true_counts(self, rows):
+        return self.running_counts[rows] * CARD_COUNT / (self.size - self.positions[rows])
+
+    # Deal the next card from each of `rows` (an index array or a slice)
+    def deal(self, rng, rows):
+        top = self.positions[rows]
+        top_index = self.bases[rows] + top
+        pick_index = top_index + (rng.random(top.size) * (self.size - top)).astype(np.intp)
+        cards = self.cards[pick_index]
+        self.cards[pick_index] = self.cards[top_index]
+        self.cards[top_index] = cards
+        self.positions[rows] += 1
+        if self.running_counts is not None:
+            self.running_counts[rows] += HI_LO_TAGS[cards]
+        return HARD_VALUES[cards]
+
+
+# Below `stand_on`, or on a soft `stand_on` when `hits_soft` is set
+def wants_card(hard, has_ace, stand_on, hits_soft):
+    total = score(hard, has_ace)
+    if hits_soft:
+        return (total < stand_on) | ((total == stand_on) & has_ace & (hard <= BLACKJACK - 10))
+    return total < stand_on
+
+
+# Keep drawing for every hand in `active` until it reaches `stand_on`; hand i plays from shoe i
+def draw_until(rng, shoe, hard, has_ace, active, stand_on, hits_soft=False):
+    hands = np.flatnonzero(active & wants_card(hard, has_ace, stand_on, hits_soft))
+    while hands.size:
+        values = shoe.deal(rng, hands)
+        hand_hard = hard[hands] + values
+        hand_ace = has_ace[hands] | (values == 1)
+        hard[hands] = hand_hard
+        has_ace[hands] = hand_ace
+        hands = hands[wants_card(hand_hard, hand_ace, stand_on, hits_soft)]
+
+
+# Most cards one round can take from a shoe: each hand can hold at most the
+# fewest low cards (aces as 1) that reach its stand total, since a soft total
+# is never lower than the hard one.
+def round_card_limit(decks, stand_on, dealer_hits_soft_17=False):
+    low_cards = sorted(1 if value == 11 else value for value in CARD_VALUES * decks)
+    used = 0
+    for target in (stand_on, DEALER_STAND_TOTAL + dealer_hits_soft_17):
+        total = 0
+        while total < target and used < len(low_cards):
+            total += low_cards[used]
+            used += 1
+    return used
+
+
+# Cut card position; the simulator keeps it far enough from the end that a
+# round can never run a shoe dry
+def cut_position(decks, penetration, stand_on, dealer_hits_soft_17=False):
+    size = decks * CARD_COUNT
+    return max(0, min(int(size * penetration), size - round_card_limit(decks, stand_on, dealer_hits_soft_17)))
+
+
+# Units staked on the hands in `mask`: one each when betting flat, else their ramp bets
+def staked(mask, bets):
+    return int(mask.sum()) if bets is None else int(bets[mask].sum())
+
+
+# Play one hand on each of the first `hands` shoes, continuing from where each shoe left off
+def play_round(rng, shoe, hands, stand_on, rules=DEFAULT_RULES, spread=None):
+    rows = slice(0, hands)
+    bets = None if spread is None else ramp_bets(spread, shoe.true_counts(rows))
+
+    # Same deal order as Blackjack.deal_initial_cards: two to the player, two to the dealer
+    first, second = shoe.deal(rng, rows), shoe.deal(rng, rows)
+    player_hard, player_ace = first + second, (first == 1) | (second == 1)
+    first, second = shoe.deal(rng, rows), shoe.deal(rng, rows)
+    dealer_hard, dealer_ace = first + second, (first == 1) | (second == 1)
+
+    # When naturals pay extra they settle at once: the dealer has peeked, so
+    # nobody draws to a hand where either side has one
+    if rules.blackjack_payout is not None:
+        player_natural = score(player_hard, player_ace) == BLACKJACK
+        dealer_natural = score(dealer_hard, dealer_ace) == BLACKJACK
+    else:
+        player_natural = dealer_natural = np.zeros(hands, dtype=bool)
+    live = ~(player_natural | dealer_natural)
+
+    draw_until(rng, shoe, player_hard, player_ace, live, stand_on)
+    player = score(player_hard, player_ace)
+    player_bust = player > BLACKJACK
+    # A busted player has already lost, so the dealer only draws for live hands
+    draw_until(rng, shoe, dealer_hard, dealer_ace, live & ~player_bust, DEALER_STAND_TOTAL, rules.dealer_hits_soft_17)
+    dealer = score(dealer_hard, dealer_ace)
+
+    blackjacks = player_natural & ~dealer_natural
+    wins = live & ~player_bust & ((dealer > BLACKJACK) | (player > dealer)) | blackjacks
+    losses = live & (player_bust | ((dealer <= BLACKJACK) & (dealer > player))) | (dealer_natural & ~player_natural)
+    stats = empty_stats()
+    stats["games"] = hands
+    stats["wins"] = int(wins.sum())
+    stats["losses"] = int(losses.sum())
+    stats["pushes"] = hands - stats["wins"] - stats["losses"]
+    stats["blackjacks"] = int(blackjacks.sum())
+    stats["wagered"] = hands if bets is None else int(bets.sum())
+    stats["net"] = ((WIN_PAYOUT - 1) * staked(wins & ~blackjacks, bets) + (LOSS_PAYOUT - 1) * staked(losses, bets)
+                    + (PUSH_PAYOUT - 1) * staked(~(wins | losses), bets))
+    # Naturals pay a fraction (3:2, 6:5); their stakes are paid out by settle_blackjacks()
+    stats["blackjack_stakes"] = staked(blackjacks, bets)
+    return stats
+
+
+# Play `hands` hands on up to SHOE_TABLES shoes side by side. Each shoe is a row
+# of a preallocated array with its own position and is reshuffled only when it
+# reaches the cut card; with the lazy shuffle that is just a position reset.
+def simulate_batch(rng, hands, stand_on=DEALER_STAND_TOTAL, rules=DEFAULT_RULES, spread=None):
+    tables = max(1, min(hands // ROUNDS_PER_SHOE_ROW, SHOE_TABLES))
+    shoe = ShoeArray(tables, rules.decks, counting=spread is not None)
+    cut = cut_position(rules.decks, rules.penetration, stand_on, rules.dealer_hits_soft_17)
+    total = empty_stats()
+    while total["games"] < hands:
+        count = min(tables, hands - total["games"])
+        positions = shoe.positions[:count]
+        reshuffle = positions >= cut
+        positions[reshuffle] = 0
+        if shoe.running_counts is not None:
+            shoe.running_counts[:count][reshuffle] = 0
+        total["shuffles"] += int(reshuffle.sum())
+        merge_stats(total, play_round(rng, shoe, count, stand_on, rules, spread))
+    return total
+
+
+def merge_stats(total, stats):
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+# Add the naturals' winnings to the merged totals. Chunks keep `net` in whole
+# units so that merging them is exact and the same for any worker count; the
+# fractional payout is applied once, here.
+def settle_blackjacks(total, rules):
+    stakes = total.pop("blackjack_stakes", 0)
+    if stakes:
+        won, stake = rules.blackjack_payout
+        total["net"] += stakes * won / stake
+    return total
+
+
+# Every chunk of `batch` hands gets its own stream derived from (seed, chunk index),
+# so the totals depend only on the seed and batch size, never on the worker count.
+def chunk_rng(seed, chunk):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk,)))
+
+
+def simulate_chunks(seed, chunks, hands, batch, stand_on, rules, spread=None):
+    total = empty_stats()
+    for chunk in chunks:
+        size = min(batch, hands - chunk * batch)
+        merge_stats(total, simulate_batch(chunk_rng(seed, chunk), size, stand_on, rules, spread))
+    return total
+
+
+def simulate(hands, seed, batch=DEFAULT_BATCH, stand_on=DEALER_STAND_TOTAL, workers=1, rules=DEFAULT_RULES,
+             spread=None):
+    chunk_count = -(-hands // batch)
+    if workers <= 1 or chunk_count <= 1:
+        return settle_blackjacks(simulate_chunks(seed, range(chunk_count), hands, batch, stand_on, rules, spread),
+                                 rules)
+
+    # A few shards per worker keeps every core busy until the end of the run
+    shard_count = min(chunk_count, workers * 4)
+    shards = [range(chunk_count * i // shard_count, chunk_count * (i + 1) // shard_count)
+              for i in range(shard_count)]
+    total = empty_stats()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(simulate_chunks, seed, shard, hands, batch, stand_on, rules, spread)
+                   for shard in shards]
+        for future in futures:
+            merge_stats(total, future.result())
+    return settle_blackjacks(total, rules)
+
+
+def summarize(stats):
+    games = max(1, stats["games"])
+    return {
+        "games": stats["games"],
+        "win_rate": stats["wins"] / games,
+        "loss_rate": stats["losses"] / games,
+        "push_rate": stats["pushes"] / games,
+        "ev_per_bet": stats["net"] / max(1, stats["wagered"]),
+        "ev_per_hand": stats["net"] / games,
+        "average_bet": stats["wagered"] / games,
+    }
+
+
+# Reference path: the original per-hand string-card logic, for speed comparison
+REFERENCE_DECK = [f"{value}_of_{suit}" for suit in ["hearts", "diamonds", "clubs", "spades"]
+                  for value in ["2", "3", "4", "5", "6", "7", "8", "9", "10", "jack", "queen", "king", "ace"]]
+
+
+def reference_card_value(card):
+    value = card.split("_")[0]
+    if value in ["jack", "queen", "king"]:
+        return 10
+    elif value == "ace":
+        return 11
+    return int(value)
+
+
+def reference_hand(hand):
+    score = 0
+    aces = 0
+    for card in hand:
+        value = reference_card_value(card)
+        if value == 11:
+            aces += 1
+        score += value
+    while score > 21 and aces:
+        score -= 10
+        aces -= 1
+    return score
+
+
+def simulate_reference(hands, seed=None, stand_on=DEALER_STAND_TOTAL):
+    rng = random.Random(seed)
+    stats = empty_stats()
+    for _ in range(hands):
+        deck = list(REFERENCE_DECK)
+        rng.shuffle(deck)
+        player = [deck.pop(), deck.pop()]
+        dealer = [deck.pop(), deck.pop()]
+        while reference_hand(player) < stand_on:
+            player.append(deck.pop())
+        while reference_hand(dealer) < DEALER_STAND_TOTAL:
+            dealer.append(deck.pop())
+        player_score, dealer_score = reference_hand(player), reference_hand(dealer)
+        stats["games"] += 1
+        stats["wagered"] += 1
+        if player_score > 21 or (dealer_score <= 21 and dealer_score > player_score):
+            stats["losses"] += 1
+            stats["net"] -= 1
+        elif dealer_score > 21 or player_score > dealer_score:
+            stats["wins"] += 1
+            stats["net"] += 1
+        else:
+            stats["pushes"] += 1
+    return stats
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def print_report(label, stats, elapsed):
+    summary = summarize(stats)
+    print(f"{label}: {summary['games']:,} hands in {elapsed:.2f}s "
+          f"({summary['games'] / elapsed:,.0f} hands/s)")
+    print(f"  win {summary['win_rate']:.4%}  loss {summary['loss_rate']:.4%}  "
+          f"push {summary['push_rate']:.4%}  EV/bet {summary['ev_per_bet']:+.5f}")
+    if summary["average_bet"] != 1:
+        print(f"  average bet {summary['average_bet']:.3f} units  EV/hand {summary['ev_per_hand']:+.5f} units")
+    print(f"  totals: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Blackjack Monte Carlo simulation")
+    parser.add_argument("--hands", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="same seed and batch give identical totals for any worker count")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes to shard the hands across (default: all cores)")
+    parser.add_argument("--stand-on", type=int, default=DEALER_STAND_TOTAL,
+                        help="player hits below this total (default mimics the dealer)")
+    add_rules_arguments(parser)
+    parser.add_argument("--spread", type=parse_spread, default=None, metavar="UNITS",
+                        help="Hi-Lo bet ramp, e.g. 1,2,4,8: units bet at true count 1 or less, 2, 3, 4 and up")
+    parser.add_argument("--compare", type=int, default=0, metavar="HANDS",
+                        help="also run HANDS hands through the per-hand reference path")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    print(f"seed: {seed}")
+    stats, elapsed = timed(simulate, args.hands, seed, args.batch, args.stand_on, args.workers,
+                           rules_from_args(args), args.spread)
+    print_report("vectorized", stats, elapsed)
+    if args.compare:
+        ref_stats, ref_elapsed = timed(simulate_reference, args.compare, seed, args.stand_on)
+        print_report("per-hand", ref_stats, ref_elapsed)
+        speedup = (stats["games"] / elapsed) / (ref_stats["games"] / ref_elapsed)
+        print(f"speedup: {speedup:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
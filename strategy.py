@@ -0,0 +1,151 @@
+# Basic-strategy table: hit or stand for every player total, soft/hard and dealer upcard
+#
+# The table is computed once from the exact dealer odds (infinite deck) and the
+# payouts in rules.py for the table's rules.Rules, saved to a small binary file and
+# memory-mapped by the game, so a hint is a single byte lookup.
+import argparse
+import mmap
+import os
+import struct
+import zlib
+from functools import lru_cache
+
+from dealer_odds import BUST, FINAL_TOTALS, INFINITE_DECK, SLOT_VALUES, dealer_probabilities
+from rules import BLACKJACK, DEALER_STAND_TOTAL, DEFAULT_RULES, OUTCOME_PAYOUTS, hand_outcome
+
+STRATEGY_FILE = "strategy.bin"
+MAGIC = b"BJST"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+
+STAND, HIT = 0, 1
+ACTIONS = ["Stand", "Hit"]
+UPCARDS = list(range(2, 12))
+TOTALS = BLACKJACK + 1
+TABLE_SIZE = TOTALS * 2 * len(UPCARDS)
+
+
+# Changes whenever a rule that affects the table does, so stale files get rebuilt.
+# Of the rule variants only the dealer's soft 17 changes hit-or-stand decisions.
+def rules_fingerprint(rules=DEFAULT_RULES):
+    fixed = (DEALER_STAND_TOTAL, BLACKJACK, sorted(OUTCOME_PAYOUTS.items()), FINAL_TOTALS, rules.dealer_hits_soft_17)
+    return zlib.crc32(repr(fixed).encode())
+
+
+def table_index(total, soft, upcard):
+    return (total * 2 + soft) * len(UPCARDS) + upcard - UPCARDS[0]
+
+
+def net_result(player_score, dealer_score):
+    return OUTCOME_PAYOUTS[hand_outcome(player_score, dealer_score)] - 1
+
+
+def stand_ev(total, upcard, hits_soft_17=False):
+    probabilities = dealer_probabilities(upcard, hits_soft_17=hits_soft_17)
+    ev = probabilities[BUST] * net_result(total, BLACKJACK + 1)
+    for slot in range(BUST):
+        ev += probabilities[slot] * net_result(total, DEALER_STAND_TOTAL + slot)
+    return ev
+
+
+def hand_total(hard, has_ace):
+    return hard + 10 if has_ace and hard + 10 <= BLACKJACK else hard
+
+
+# Best EV from a hand given the option to keep hitting, and the EV of hitting once then playing on
+@lru_cache(maxsize=None)
+def best_ev(hard, has_ace, upcard, hits_soft_17=False):
+    return max(stand_ev(hand_total(hard, has_ace), upcard, hits_soft_17), hit_ev(hard, has_ace, upcard, hits_soft_17))
+
+
+@lru_cache(maxsize=None)
+def hit_ev(hard, has_ace, upcard, hits_soft_17=False):
+    ev = 0.0
+    for value, p in zip(SLOT_VALUES, INFINITE_DECK):
+        new_hard = hard + value
+        if new_hard > BLACKJACK:
+            ev -= p
+        else:
+            ev += p * best_ev(new_hard, has_ace or value == 1, upcard, hits_soft_17)
+    return ev
+
+
+def build_table(rules=DEFAULT_RULES):
+    h17 = rules.dealer_hits_soft_17
+    actions = bytearray(TABLE_SIZE)
+    evs = [0.0] * (TABLE_SIZE * 2)
+    for upcard in UPCARDS:
+        for total in range(4, TOTALS):
+            for soft in (0, 1):
+                if soft and total < 12:
+                    continue
+                # A soft total counts one ace as 11; its hard total is 10 lower
+                hard = total - 10 if soft else total
+                stand, hit = stand_ev(total, upcard, h17), hit_ev(hard, bool(soft), upcard, h17)
+                index = table_index(total, soft, upcard)
+                actions[index] = HIT if hit > stand else STAND
+                evs[index * 2], evs[index * 2 + 1] = stand, hit
+    return bytes(actions), evs
+
+
+def write_table(path=STRATEGY_FILE, rules=DEFAULT_RULES):
+    actions, evs = build_table(rules)
+    data = HEADER.pack(MAGIC, VERSION, rules_fingerprint(rules)) + actions + struct.pack(f"<{len(evs)}f", *evs)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class StrategyTable:
+    def __init__(self, data):
+        self.data = data
+
+    def action(self, total, soft, upcard):
+        if total > BLACKJACK:
+            return None
+        return ACTIONS[self.data[HEADER.size + table_index(total, int(soft), upcard)]]
+
+    def evs(self, total, soft, upcard):
+        offset = HEADER.size + TABLE_SIZE + table_index(total, int(soft), upcard) * 8
+        return struct.unpack_from("<2f", self.data, offset)
+
+
+def is_current(path, rules=DEFAULT_RULES):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return False
+    return len(header) == HEADER.size and HEADER.unpack(header) == (MAGIC, VERSION, rules_fingerprint(rules))
+
+
+# Memory-map the table, building it first if it is missing or was built for other rules
+def load_strategy_table(path=STRATEGY_FILE, rules=DEFAULT_RULES):
+    if not is_current(path, rules):
+        write_table(path, rules)
+    with open(path, "rb") as f:
+        try:
+            return StrategyTable(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            # No mmap support (e.g. the browser build): the file is only a few KB
+            return StrategyTable(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and print the basic-strategy table")
+    parser.add_argument("--output", default=STRATEGY_FILE)
+    parser.add_argument("--h17", action="store_true", help="dealer hits soft 17")
+    args = parser.parse_args()
+
+    rules = DEFAULT_RULES._replace(dealer_hits_soft_17=args.h17)
+    write_table(args.output, rules)
+    table = load_strategy_table(args.output, rules)
+    print(f"wrote {args.output} ({os.path.getsize(args.output)} bytes)")
+    print("      " + "".join(f"{'A' if up == 11 else up:>3}" for up in UPCARDS))
+    for soft in (0, 1):
+        for total in range(12 if soft else 4, TOTALS):
+            label = f"{'S' if soft else 'H'}{total}"
+            print(f"{label:<6}" + "".join(f"{table.action(total, soft, up)[0]:>3}" for up in UPCARDS))
+
+
+if __name__ == "__main__":
+    main()